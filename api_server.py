@@ -0,0 +1,147 @@
+"""
+Headless JSON API over the same fetch and cache engine as the dashboard.
+
+    python api_server.py                # or: uvicorn api_server:app --port 8080
+
+    GET  /v1/current?city=London        current conditions
+    GET  /v1/forecast?lat=51.5&lon=-0.1 7-day forecast for coordinates
+    POST /v1/batch {"cities": ["London", "Paris"], "include": ["current", "forecast"]}
+
+Responses carry an ETag and a Cache-Control max-age equal to the remaining
+lifetime of the engine's cache entries they were built from, and a matching
+If-None-Match is answered with 304. With
+WEATHER_CACHE_BACKEND=sqlite this process and the Wave app share cached
+geocoding and weather results, so neither repeats the other's upstream calls.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.api import cached_until, get_forecast_data, get_weather_data, search_locations
+from app.decoding import dumps, loads
+
+API_HOST = os.environ.get('WEATHER_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('WEATHER_API_PORT', 8080))  # Wave apps listen on 8000 by default
+BATCH_LIMIT = int(os.environ.get('WEATHER_API_BATCH_LIMIT', 50))
+
+# What each lookup returns; its cache entry's expiry is looked up under the same name
+LOOKUPS = {
+    'current': get_weather_data,
+    'forecast': get_forecast_data,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(request: Request, body: Dict, status: int = 200, max_age: int = 0) -> Response:
+    """JSON response with an ETag; 304 when the client already has this body."""
+    content = dumps(body)
+    if status != 200:
+        return Response(content, status_code=status, media_type='application/json')
+    etag = '"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={max_age}'}
+    client_tags = request.headers.get('if-none-match', '')
+    if etag in (tag.strip().removeprefix('W/') for tag in client_tags.split(',')) or client_tags.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type='application/json', headers=headers)
+
+
+async def resolve(city: Optional[str], lat: Optional[str] = None, lon: Optional[str] = None) -> Dict:
+    """A location from coordinates or from the best geocoding match of a city name."""
+    if lat is not None and lon is not None:
+        try:
+            latitude, longitude = float(lat), float(lon)
+        except ValueError:
+            raise ApiError(400, 'lat and lon must be numbers')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ApiError(400, 'lat/lon out of range')
+        return {'name': city or f"{latitude:.2f},{longitude:.2f}", 'latitude': latitude, 'longitude': longitude}
+    if not city:
+        raise ApiError(400, 'pass city=<name> or lat=<deg>&lon=<deg>')
+    candidates = await search_locations(city)
+    if not candidates:
+        raise ApiError(404, f'city not found: {city}')
+    return candidates[0]
+
+
+async def lookup(location: Dict, include: List[str]) -> Tuple[Dict, int]:
+    """Fetch the requested lookups for one location concurrently; returns the body and its max-age."""
+    results = await asyncio.gather(*(LOOKUPS[name](location['name'], location) for name in include))
+    body = {'location': location}
+    for name, result in zip(include, results):
+        if result is None:
+            raise ApiError(502, f'upstream {name} lookup failed')
+        body[name] = result['list'] if name == 'forecast' else result
+    # The body is as fresh as its oldest cache entry; uncached results are not to be reused
+    expiries = await asyncio.gather(*(cached_until(name, location) for name in include))
+    now = time.time()
+    return body, min(0 if expires is None else max(0, int(expires - now)) for expires in expiries)
+
+
+def single(name: str):
+    async def endpoint(request: Request) -> Response:
+        params = request.query_params
+        try:
+            location = await resolve(params.get('city'), params.get('lat'), params.get('lon'))
+            body, max_age = await lookup(location, [name])
+        except ApiError as e:
+            return json_response(request, {'error': str(e)}, e.status)
+        return json_response(request, body, max_age=max_age)
+    return endpoint
+
+
+async def batch(request: Request) -> Response:
+    try:
+        payload = loads(await request.body())
+    except ValueError:
+        return json_response(request, {'error': 'body must be JSON'}, 400)
+    cities = payload.get('cities') if isinstance(payload, dict) else None
+    include = payload.get('include', list(LOOKUPS)) if isinstance(payload, dict) else None
+    if not isinstance(cities, list) or not cities or not all(isinstance(city, str) for city in cities):
+        return json_response(request, {'error': 'cities must be a non-empty list of names'}, 400)
+    if len(cities) > BATCH_LIMIT:
+        return json_response(request, {'error': f'at most {BATCH_LIMIT} cities per batch'}, 400)
+    if not isinstance(include, list) or not include or any(name not in LOOKUPS for name in include):
+        return json_response(request, {'error': f'include must name some of {sorted(LOOKUPS)}'}, 400)
+
+    async def one(city: str) -> Tuple[Dict, Optional[int]]:
+        try:
+            body, max_age = await lookup(await resolve(city), include)
+            return dict(body, query=city), max_age
+        except ApiError as e:
+            return {'query': city, 'error': str(e), 'status': e.status}, None
+
+    # Duplicate names share one lookup
+    unique = list(dict.fromkeys(cities))
+    results = dict(zip(unique, await asyncio.gather(*(one(city) for city in unique))))
+    max_ages = [max_age for _, max_age in results.values() if max_age is not None]
+    return json_response(request, {'results': [results[city][0] for city in cities]},
+                         max_age=min(max_ages, default=0))
+
+
+async def health(request: Request) -> Response:
+    return Response(dumps({'status': 'ok'}), media_type='application/json')
+
+
+app = Starlette(routes=[
+    Route('/v1/current', single('current')),
+    Route('/v1/forecast', single('forecast')),
+    Route('/v1/batch', batch, methods=['POST']),
+    Route('/v1/health', health),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -0,0 +1,191 @@
+"""
+Forecast alerts for watched cities, evaluated incrementally.
+
+Users attach threshold rules (rain chance, wind, heat, frost) to their
+favorite places. A client's rules live until it disconnects, even while
+its session is compacted. Rules are indexed by the place's rounded
+coordinates, and each place remembers a fingerprint of the forecast its rules
+were last checked against. A refresh only re-checks the rules of places whose
+forecast actually changed, so the work follows the number of changed
+forecasts rather than the number of rules.
+"""
+import asyncio
+import itertools
+import os
+from typing import Dict, List, Optional, Tuple
+
+ALERT_REFRESH_SECONDS = float(os.environ.get('WEATHER_ALERT_REFRESH_SECONDS', 10 * 60))
+ALERT_REFRESH_CONCURRENCY = int(os.environ.get('WEATHER_ALERT_REFRESH_CONCURRENCY', 8))
+
+# metric: (label, unit of the stored threshold, fires when the value is above the threshold?)
+RULE_METRICS = {
+    'precipitation': ('Rain chance', '%', True),
+    'wind': ('Wind', 'm/s', True),
+    'heat': ('High', '°C', True),
+    'frost': ('Low', '°C', False),
+}
+
+
+def location_key(location: Dict) -> str:
+    """Index key of a place: its coordinates rounded to about a kilometre, as in the API caches."""
+    return f"{location['latitude']:.2f},{location['longitude']:.2f}"
+
+
+def day_value(day: Dict, metric: str) -> Optional[float]:
+    """The value a rule of `metric` compares for one forecast day, or None if unknown."""
+    if metric == 'precipitation':
+        return None if day.get('pop') is None else day['pop'] * 100
+    if metric == 'wind':
+        return day['wind']['speed']
+    if metric == 'heat':
+        return day['main'].get('temp_max', day['main']['temp'])
+    if metric == 'frost':
+        return day['main'].get('temp_min', day['main']['temp'])
+    raise ValueError(f"Unknown alert metric: {metric}")
+
+
+def fingerprint(forecast: Dict) -> int:
+    """Cheap identity of the parts of a forecast that rules look at."""
+    return hash(tuple(
+        (day['dt_txt'], day.get('pop'), day['wind']['speed'], day['main'].get('temp_min'), day['main'].get('temp_max'))
+        for day in forecast['list']
+    ))
+
+
+class AlertRule:
+    """One threshold on one place, owned by one client."""
+
+    __slots__ = ('id', 'owner', 'key', 'location', 'metric', 'threshold')
+
+    def __init__(self, rule_id: int, owner: str, location: Dict, metric: str, threshold: float):
+        self.id = rule_id
+        self.owner = owner
+        self.key = location_key(location)
+        self.location = location
+        self.metric = metric
+        self.threshold = threshold
+
+    def check(self, forecast: Dict) -> Optional[Dict]:
+        """The first forecast day crossing the threshold, or None."""
+        above = RULE_METRICS[self.metric][2]
+        for day in forecast['list']:
+            value = day_value(day, self.metric)
+            if value is not None and (value >= self.threshold if above else value <= self.threshold):
+                return {'date': day['dt_txt'].split(' ')[0], 'value': value}
+        return None
+
+
+class AlertEngine:
+    """Rules indexed by place, re-checked only when that place's forecast changes."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._rules: Dict[int, AlertRule] = {}
+        self._by_key: Dict[str, Dict[int, AlertRule]] = {}
+        self._by_owner: Dict[str, Dict[int, AlertRule]] = {}
+        self._fingerprints: Dict[str, int] = {}
+        self._firing: Dict[int, Dict] = {}
+        self.evaluations = 0  # Rule checks performed, for tests and gauges
+
+    def add(self, owner: str, location: Dict, metric: str, threshold: float) -> AlertRule:
+        if metric not in RULE_METRICS:
+            raise ValueError(f"Unknown alert metric: {metric}")
+        rule = AlertRule(next(self._ids), owner, location, metric, threshold)
+        self._rules[rule.id] = rule
+        self._by_key.setdefault(rule.key, {})[rule.id] = rule
+        self._by_owner.setdefault(owner, {})[rule.id] = rule
+        # The new rule has not seen this place's forecast yet
+        self._fingerprints.pop(rule.key, None)
+        return rule
+
+    def remove(self, rule_id: int) -> None:
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return
+        self._firing.pop(rule_id, None)
+        for index, key in ((self._by_key, rule.key), (self._by_owner, rule.owner)):
+            rules = index[key]
+            del rules[rule_id]
+            if not rules:
+                del index[key]
+        if rule.key not in self._by_key:
+            self._fingerprints.pop(rule.key, None)
+
+    def discard_owner(self, owner: str) -> int:
+        """Drop the rules of a departed client; returns how many were dropped."""
+        gone = list(self._by_owner.get(owner, ()))
+        for rule_id in gone:
+            self.remove(rule_id)
+        return len(gone)
+
+    def rules_for(self, owner: str) -> List[AlertRule]:
+        return list(self._by_owner.get(owner, {}).values())
+
+    def alerts_for(self, owner: str) -> List[Tuple[AlertRule, Dict]]:
+        """Firing rules of an owner with the first day that crosses each threshold."""
+        return [(rule, self._firing[rule.id]) for rule in self.rules_for(owner) if rule.id in self._firing]
+
+    def watched(self) -> Dict[str, Dict]:
+        """One location per place that has rules."""
+        return {key: next(iter(rules.values())).location for key, rules in self._by_key.items()}
+
+    def on_forecast(self, location: Dict, forecast: Optional[Dict]) -> List[AlertRule]:
+        """
+        Re-check the rules of one place against its current forecast.
+
+        Does nothing if the place has no rules or the forecast is the one its
+        rules were last checked against. Returns the rules that started firing.
+        """
+        key = location_key(location)
+        rules = self._by_key.get(key)
+        if not rules or not forecast or not forecast.get('list'):
+            return []
+        stamp = fingerprint(forecast)
+        if self._fingerprints.get(key) == stamp:
+            return []
+        self._fingerprints[key] = stamp
+        started = []
+        for rule in rules.values():
+            self.evaluations += 1
+            hit = rule.check(forecast)
+            if hit is None:
+                self._firing.pop(rule.id, None)
+                continue
+            if rule.id not in self._firing:
+                started.append(rule)
+            self._firing[rule.id] = hit
+        return started
+
+    async def refresh(self, fetch_forecast) -> List[AlertRule]:
+        """Fetch every watched place's forecast (cache hits are free) and re-check changed ones."""
+        gate = asyncio.Semaphore(ALERT_REFRESH_CONCURRENCY)
+
+        async def one(location):
+            async with gate:
+                return self.on_forecast(location, await fetch_forecast(location['name'], location))
+
+        started = await asyncio.gather(*(one(location) for location in self.watched().values()))
+        return [rule for rules in started for rule in rules]
+
+    async def run_refresher(self, interval: float = ALERT_REFRESH_SECONDS) -> None:
+        """Periodically re-check watched places."""
+        from app.api import get_forecast_data
+        while True:
+            await asyncio.sleep(interval)
+            evaluations = self.evaluations
+            started = await self.refresh(get_forecast_data)
+            print(f"Alerts: {len(self._rules)} rules on {len(self._by_key)} places, "
+                  f"{self.evaluations - evaluations} checked, {len(started)} started firing")
+
+    def clear(self) -> None:
+        self._rules.clear()
+        self._by_key.clear()
+        self._by_owner.clear()
+        self._fingerprints.clear()
+        self._firing.clear()
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+
+alerts = AlertEngine()
@@ -1,51 +1,290 @@
-import requests
-from typing import Dict, Optional, Tuple
+import asyncio
+import os
+from datetime import date, timedelta
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
 
-BASE_URL = "https://api.open-meteo.com/v1"
+from app.autocomplete import CityIndex, merge_suggestions
+from app.cache import CacheBackend, make_cache
+from app.cassette import CassetteError, get_cassette
+from app.decoding import decode_daily, is_missing, loads, project
+from app import gazetteer
+from app.spatial import GridIndex
+from app.timeseries import HISTORY_DIR, TimeSeriesStore
+from app.utils import normalize_city_name
 
-async def get_coordinates(city: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
-    """Get coordinates for a city using geocoding API."""
+# Overridable so tests and load tests can point at a local Open-Meteo stand-in
+BASE_URL = os.environ.get('OPEN_METEO_BASE_URL', "https://api.open-meteo.com/v1")
+GEOCODING_URL = os.environ.get('OPEN_METEO_GEOCODING_URL', "https://geocoding-api.open-meteo.com/v1/search")
+ARCHIVE_URL = os.environ.get('OPEN_METEO_ARCHIVE_URL', "https://archive-api.open-meteo.com/v1/archive")
+AIR_QUALITY_URL = os.environ.get('OPEN_METEO_AIR_QUALITY_URL', "https://air-quality-api.open-meteo.com/v1/air-quality")
+
+GEOCODE_TTL_SECONDS = 24 * 60 * 60  # Place coordinates practically never change
+GEOCODE_CANDIDATES = 5  # Places fetched per search so ambiguous names need no second call
+SUGGESTION_LIMIT = 5
+# Places learned from geocoding results kept for suggestions, least recently used evicted first
+SUGGESTION_INDEX_MAX_ENTRIES = int(os.environ.get('WEATHER_SUGGESTION_INDEX_MAX_ENTRIES', 5000))
+
+WEATHER_TTL_SECONDS = 10 * 60  # Open-Meteo refreshes current conditions every 15 minutes
+FORECAST_TTL_SECONDS = 30 * 60
+AIR_QUALITY_TTL_SECONDS = 60 * 60  # The air-quality model is hourly
+
+# Serve a fresh cached result for any query within this distance of it (0 disables).
+# Forecast grids are coarser than current conditions, so they tolerate a wider radius.
+WEATHER_NEARBY_RADIUS_KM = float(os.environ.get('WEATHER_NEARBY_RADIUS_KM', '3'))
+FORECAST_NEARBY_RADIUS_KM = float(os.environ.get('FORECAST_NEARBY_RADIUS_KM', '10'))
+AIR_QUALITY_NEARBY_RADIUS_KM = float(os.environ.get('AIR_QUALITY_NEARBY_RADIUS_KM', '10'))
+
+FORECAST_DAILY_FIELDS = (
+    'temperature_2m_max',
+    'temperature_2m_min',
+    'precipitation_probability_max',
+    'weather_code',
+    'wind_speed_10m_max',
+    'relative_humidity_2m_max',
+)
+
+# Pollen is only modelled for Europe; elsewhere those values come back as null
+AIR_QUALITY_FIELDS = (
+    'european_aqi',
+    'us_aqi',
+    'pm10',
+    'pm2_5',
+    'uv_index',
+    'alder_pollen',
+    'birch_pollen',
+    'grass_pollen',
+    'ragweed_pollen',
+)
+
+HISTORY_DAILY_FIELDS = (
+    'temperature_2m_max',
+    'temperature_2m_min',
+    'precipitation_sum',
+    'weather_code',
+    'wind_speed_10m_max',
+)
+# The archive is built from reanalysis data that trails real time by a few days
+ARCHIVE_DELAY_DAYS = 5
+
+# Candidate locations keyed by normalized query
+geocode_cache = make_cache('geocode', ttl=GEOCODE_TTL_SECONDS)
+
+# Formatted weather and forecast results keyed by rounded coordinates, plus
+# spatial indexes over those keys for nearby lookups
+weather_cache = make_cache('weather', ttl=WEATHER_TTL_SECONDS)
+forecast_cache = make_cache('forecast', ttl=FORECAST_TTL_SECONDS)
+air_quality_cache = make_cache('air_quality', ttl=AIR_QUALITY_TTL_SECONDS)
+weather_grid = GridIndex()
+forecast_grid = GridIndex()
+air_quality_grid = GridIndex()
+
+# Archived days per rounded coordinate; past weather never changes, so nothing expires
+# Days the archive has no temperatures for yet are fetched again later
+history_store = TimeSeriesStore(HISTORY_DIR, HISTORY_DAILY_FIELDS,
+                                required=('temperature_2m_max', 'temperature_2m_min'))
+
+# Cities learned from geocoding results for autocomplete; the bundled
+# gazetteer is completed in place from its memory-mapped index instead
+_city_index: Optional[CityIndex] = None
+
+def get_city_index() -> CityIndex:
+    """Return the index of geocoded cities."""
+    global _city_index
+    if _city_index is None:
+        _city_index = CityIndex(max_entries=SUGGESTION_INDEX_MAX_ENTRIES)
+    return _city_index
+
+async def seed_city_index() -> None:
+    """Add the places in the geocoding cache (possibly shared with other workers) to the index."""
+    for _, locations in await geocode_cache.items_async():
+        get_city_index().add_all(locations)
+
+def clear_caches() -> None:
+    """Forget every cached geocoding, weather, forecast and air-quality result."""
+    global _city_index
+    for cache in (geocode_cache, weather_cache, forecast_cache, air_quality_cache):
+        cache.clear()
+    _city_index = None
+    weather_grid.clear()
+    forecast_grid.clear()
+    air_quality_grid.clear()
+
+def _coordinate_key(lat: float, lon: float) -> str:
+    """Cache key for a coordinate, rounded to about a kilometre."""
+    return f"{lat:.2f},{lon:.2f}"
+
+async def _cached_entry_near(cache: CacheBackend, grid: GridIndex, lat: float, lon: float,
+                             radius_km: float) -> Tuple[Optional[str], Optional[Dict]]:
+    """Return the key and value of the closest fresh cached result within `radius_km`, dropping expired keys on the way."""
+    # The exact spot may have been cached by another worker sharing the backend
+    key = _coordinate_key(lat, lon)
+    value = await cache.get_async(key)
+    if value is not None:
+        grid.add(key, lat, lon)
+        return key, value
+    for _, key in grid.within(lat, lon, radius_km):
+        value = await cache.get_async(key)
+        if value is not None:
+            return key, value
+        grid.discard(key)
+    return None, None
+
+async def _cached_near(cache: CacheBackend, grid: GridIndex, lat: float, lon: float, radius_km: float) -> Optional[Dict]:
+    """Return the closest fresh cached result within `radius_km`."""
+    return (await _cached_entry_near(cache, grid, lat, lon, radius_km))[1]
+
+async def cached_until(kind: str, location: Dict) -> Optional[float]:
+    """Wall-clock expiry of the cached 'current', 'forecast' or 'air_quality' result serving `location`, or None."""
+    cache, grid, radius_km = {
+        'current': (weather_cache, weather_grid, WEATHER_NEARBY_RADIUS_KM),
+        'forecast': (forecast_cache, forecast_grid, FORECAST_NEARBY_RADIUS_KM),
+        'air_quality': (air_quality_cache, air_quality_grid, AIR_QUALITY_NEARBY_RADIUS_KM),
+    }[kind]
+    key, _ = await _cached_entry_near(cache, grid, location['latitude'], location['longitude'], radius_km)
+    return None if key is None else await cache.expires_at_async(key)
+
+async def _remember(cache: CacheBackend, grid: GridIndex, lat: float, lon: float, value: Dict) -> None:
+    key = _coordinate_key(lat, lon)
+    await cache.set_async(key, value)
+    grid.add(key, lat, lon)
+
+class UpstreamError(Exception):
+    """An Open-Meteo request failed: connection error, timeout or HTTP error status."""
+
+def _download(url: str, params: Dict) -> bytes:
+    """Issue a GET request and return the raw response body."""
+    # Imported on first use: requests and its dependencies are a large share of start-up time
+    import requests
     try:
-        geocoding_url = f"https://geocoding-api.open-meteo.com/v1/search"
-        geocoding_params = {
-            'name': city,
-            'count': 1,
-            'language': 'en',
-            'format': 'json'
-        }
-        
-        geocoding_response = requests.get(geocoding_url, params=geocoding_params)
-        geocoding_response.raise_for_status()
-        geocoding_data = geocoding_response.json()
-        
-        if not geocoding_data.get('results'):
-            return None, None, None
-            
-        location = geocoding_data['results'][0]
-        return location['latitude'], location['longitude'], location['name']
+        response = requests.get(url, params=params)
+        response.raise_for_status()
     except requests.RequestException as e:
+        raise UpstreamError(e) from e
+    return response.content
+
+def _get_json(url: str, params: Dict) -> Dict:
+    """GET a JSON document, through the record/replay cassette when one is configured."""
+    cassette = get_cassette()
+    if cassette is None:
+        return loads(_download(url, params))
+    try:
+        return loads(cassette.fetch(url, params, _download))
+    except CassetteError as e:
+        raise UpstreamError(e) from e
+
+async def _fetch_json(url: str, params: Dict) -> Dict:
+    """Run `_get_json` in a worker thread so concurrent fetches overlap and the event loop stays free."""
+    return await asyncio.get_running_loop().run_in_executor(None, _get_json, url, params)
+
+def _location_from_result(result: Dict) -> Dict:
+    """Keep the fields of a geocoding result the app uses."""
+    return {
+        'name': result['name'],
+        'country': result.get('country', ''),
+        'admin1': result.get('admin1', ''),
+        'latitude': result['latitude'],
+        'longitude': result['longitude'],
+        'population': result.get('population') or 0,
+    }
+
+async def _geocode(name: str, count: int) -> List[Dict]:
+    """Call the geocoding API and return up to `count` locations."""
+    geocoding_params = {
+        'name': name,
+        'count': count,
+        'language': 'en',
+        'format': 'json'
+    }
+    geocoding_data = await _fetch_json(GEOCODING_URL, geocoding_params)
+    return [_location_from_result(result) for result in geocoding_data.get('results') or []]
+
+def lookup_offline(city: str) -> List[Dict]:
+    """Resolve a city from the bundled gazetteer without any network call."""
+    index = gazetteer.get_index()
+    if index is None:
+        return []
+    return index.lookup(city)
+
+async def search_locations(city: str) -> List[Dict]:
+    """
+    Return the candidate places for a city name, best match first.
+
+    One lookup fetches up to GEOCODE_CANDIDATES places and caches them all, so
+    choosing another candidate later needs no further geocoding.
+    """
+    try:
+        key = normalize_city_name(city)
+        locations = await geocode_cache.get_async(key) or lookup_offline(city)
+        if not locations:
+            locations = await _geocode(city, GEOCODE_CANDIDATES)
+            if not locations:
+                return []
+            await geocode_cache.set_async(key, locations)
+            get_city_index().add_all(locations)
+        return locations
+    except UpstreamError as e:
         print(f"Error in geocoding: {e}")
+        return []
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error processing geocoding data: {e}")
+        return []
+
+async def get_coordinates(city: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """Get coordinates of the best match for a city, from the gazetteer when possible."""
+    locations = await search_locations(city)
+    if not locations:
         return None, None, None
+    location = locations[0]
+    return location['latitude'], location['longitude'], location['name']
 
-async def get_weather_data(city: str) -> Optional[Dict]:
-    """Fetch current weather data for a given city."""
+def suggest_cities(prefix: str, limit: int = SUGGESTION_LIMIT) -> List[Dict]:
+    """Suggest known cities starting with `prefix` without any network call."""
+    index = gazetteer.get_index()
+    offline = index.complete(prefix, limit) if index is not None else []
+    return merge_suggestions([offline, get_city_index().complete(prefix, limit)], limit)
+
+async def fetch_city_suggestions(prefix: str, limit: int = SUGGESTION_LIMIT) -> List[Dict]:
+    """Ask the geocoding API for cities matching `prefix` and remember them for later lookups."""
+    try:
+        locations = await _geocode(prefix, limit)
+    except UpstreamError as e:
+        print(f"Error fetching city suggestions: {e}")
+        return []
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error processing city suggestions: {e}")
+        return []
+    get_city_index().add_all(locations)
+    return locations
+
+async def _resolve(city: str, location: Optional[Dict]) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """Use an already chosen location as is, otherwise geocode the city name."""
+    if location is not None:
+        return location['latitude'], location['longitude'], location['name']
+    return await get_coordinates(city)
+
+async def get_weather_data(city: str, location: Optional[Dict] = None) -> Optional[Dict]:
+    """Fetch current weather data for a given city, or for an already resolved location."""
     try:
         # Get coordinates first
-        lat, lon, city_name = await get_coordinates(city)
-        if not lat or not lon:
+        lat, lon, city_name = await _resolve(city, location)
+        if lat is None or lon is None:
             return None
+
+        cached = await _cached_near(weather_cache, weather_grid, lat, lon, WEATHER_NEARBY_RADIUS_KM)
+        if cached is not None:
+            return dict(cached, name=city_name)
             
         # Get weather data using coordinates
         weather_params = {
             'latitude': lat,
             'longitude': lon,
             'current': 'temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code,surface_pressure,apparent_temperature',
+            'wind_speed_unit': 'ms',  # The views expect m/s; Open-Meteo defaults to km/h
             'timezone': 'auto'
         }
         
-        weather_response = requests.get(f"{BASE_URL}/forecast", params=weather_params)
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
+        weather_data = await _fetch_json(f"{BASE_URL}/forecast", weather_params)
         
         if 'current' not in weather_data:
             return None
@@ -55,7 +294,7 @@ async def get_weather_data(city: str) -> Optional[Dict]:
         condition_id = convert_wmo_to_owm_code(wmo_code)
         
         # Format the response to match our application's needs
-        return {
+        result = {
             'name': city_name,
             'main': {
                 'temp': weather_data['current']['temperature_2m'],
@@ -71,75 +310,202 @@ async def get_weather_data(city: str) -> Optional[Dict]:
                 'description': get_weather_description(wmo_code)
             }]
         }
-    except requests.RequestException as e:
+        await _remember(weather_cache, weather_grid, lat, lon, result)
+        return result
+    except UpstreamError as e:
         print(f"Error fetching weather data: {e}")
         return None
-    except (KeyError, TypeError) as e:
+    except (KeyError, TypeError, ValueError) as e:
         print(f"Error processing weather data: {e}")
         return None
 
-async def get_forecast_data(city: str) -> Optional[Dict]:
-    """Fetch 7-day weather forecast for a given city."""
+async def get_forecast_data(city: str, location: Optional[Dict] = None) -> Optional[Dict]:
+    """Fetch 7-day weather forecast for a given city, or for an already resolved location."""
     try:
         # Get coordinates first
-        lat, lon, _ = await get_coordinates(city)
-        if not lat or not lon:
+        lat, lon, _ = await _resolve(city, location)
+        if lat is None or lon is None:
             return None
+
+        cached = await _cached_near(forecast_cache, forecast_grid, lat, lon, FORECAST_NEARBY_RADIUS_KM)
+        if cached is not None:
+            return cached
             
         # Get forecast data
         forecast_params = {
             'latitude': lat,
             'longitude': lon,
-            'daily': 'temperature_2m_max,temperature_2m_min,precipitation_probability_max,weather_code,wind_speed_10m_max,relative_humidity_2m_max',
+            'daily': ','.join(FORECAST_DAILY_FIELDS),
+            'wind_speed_unit': 'ms',  # Views and alert rules expect m/s; Open-Meteo defaults to km/h
             'timezone': 'auto'
         }
         
-        forecast_response = requests.get(f"{BASE_URL}/forecast", params=forecast_params)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
-        
-        if 'daily' not in forecast_data:
+        forecast_data = await _fetch_json(f"{BASE_URL}/forecast", forecast_params)
+        daily = decode_daily(forecast_data, FORECAST_DAILY_FIELDS)
+        if daily is None:
             return None
             
         # Format the response
-        return {
-            'list': [
-                {
-                    'dt_txt': f"{date} 12:00:00",  # Add time component for compatibility
-                    'main': {
-                        'temp': (max_temp + min_temp) / 2,  # Average of max and min
-                        'feels_like': calculate_feels_like(
-                            (max_temp + min_temp) / 2, 
-                            humidity, 
-                            wind_speed
-                        ),  # Better feels_like calculation
-                        'humidity': humidity if humidity else 50  # Use actual humidity
-                    },
-                    'weather': [{
-                        'id': convert_wmo_to_owm_code(weather_code),
-                        'description': get_weather_description(weather_code)
-                    }],
-                    'wind': {
-                        'speed': wind_speed if wind_speed else 0  # Use actual wind speed
-                    }
-                }
-                for date, max_temp, min_temp, weather_code, wind_speed, humidity in zip(
-                    forecast_data['daily']['time'],
-                    forecast_data['daily']['temperature_2m_max'],
-                    forecast_data['daily']['temperature_2m_min'],
-                    forecast_data['daily']['weather_code'],
-                    forecast_data['daily'].get('wind_speed_10m_max', [0]*7),  # Default to 0 if not available
-                    forecast_data['daily'].get('relative_humidity_2m_max', [50]*7)  # Default to 50 if not available
-                )
-            ]
-        }
-    except requests.RequestException as e:
+        forecast_list = []
+        for date, max_temp, min_temp, weather_code, wind_speed, humidity, precipitation_probability in zip(
+            daily['time'],
+            daily['temperature_2m_max'],
+            daily['temperature_2m_min'],
+            daily['weather_code'],
+            daily['wind_speed_10m_max'] or repeat(0),  # Default to 0 if not available
+            daily['relative_humidity_2m_max'] or repeat(50),  # Default to 50 if not available
+            daily['precipitation_probability_max'] or repeat(None)
+        ):
+            if is_missing(max_temp) or is_missing(min_temp):
+                continue  # Skip days the model has no temperatures for
+            if is_missing(wind_speed):
+                wind_speed = 0
+            if is_missing(humidity):
+                humidity = 50
+            weather_code = 0 if is_missing(weather_code) else int(weather_code)
+            forecast_list.append({
+                'dt_txt': f"{date} 12:00:00",  # Add time component for compatibility
+                'main': {
+                    'temp': (max_temp + min_temp) / 2,  # Average of max and min
+                    'feels_like': calculate_feels_like(
+                        (max_temp + min_temp) / 2, 
+                        humidity, 
+                        wind_speed
+                    ),  # Better feels_like calculation
+                    'humidity': humidity if humidity else 50,  # Use actual humidity
+                    'temp_min': min_temp,
+                    'temp_max': max_temp
+                },
+                'weather': [{
+                    'id': convert_wmo_to_owm_code(weather_code),
+                    'description': get_weather_description(weather_code)
+                }],
+                'wind': {
+                    'speed': wind_speed if wind_speed else 0  # Use actual wind speed
+                },
+                # Probability of precipitation as a 0-1 fraction, like OpenWeatherMap's `pop`
+                'pop': None if is_missing(precipitation_probability) else precipitation_probability / 100
+            })
+        result = {'list': forecast_list}
+        await _remember(forecast_cache, forecast_grid, lat, lon, result)
+        return result
+    except UpstreamError as e:
         print(f"Error fetching forecast data: {e}")
         return None
-    except (KeyError, TypeError) as e:
+    except (KeyError, TypeError, ValueError) as e:
         print(f"Error processing forecast data: {e}")
         return None
 
+async def get_air_quality_data(city: str, location: Optional[Dict] = None) -> Optional[Dict]:
+    """Fetch current air quality, UV index and pollen for a given city, or for an already resolved location."""
+    try:
+        lat, lon, _ = await _resolve(city, location)
+        if lat is None or lon is None:
+            return None
+
+        cached = await _cached_near(air_quality_cache, air_quality_grid, lat, lon, AIR_QUALITY_NEARBY_RADIUS_KM)
+        if cached is not None:
+            return cached
+
+        air_quality_params = {
+            'latitude': lat,
+            'longitude': lon,
+            'current': ','.join(AIR_QUALITY_FIELDS),
+            'timezone': 'auto'
+        }
+        current = project(await _fetch_json(AIR_QUALITY_URL, air_quality_params), 'current', AIR_QUALITY_FIELDS)
+        if current is None:
+            return None
+
+        result = {
+            'european_aqi': current['european_aqi'],
+            'us_aqi': current['us_aqi'],
+            'pm10': current['pm10'],
+            'pm2_5': current['pm2_5'],
+            'uv_index': current['uv_index'],
+            # Only the pollen types the model reports for this place
+            'pollen': {
+                field[:-len('_pollen')]: current[field]
+                for field in AIR_QUALITY_FIELDS
+                if field.endswith('_pollen') and current[field] is not None
+            }
+        }
+        await _remember(air_quality_cache, air_quality_grid, lat, lon, result)
+        return result
+    except UpstreamError as e:
+        print(f"Error fetching air quality data: {e}")
+        return None
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error processing air quality data: {e}")
+        return None
+
+def latest_archived_day(today: Optional[date] = None) -> date:
+    """The most recent day the archive API can be expected to have."""
+    return (today or date.today()) - timedelta(days=ARCHIVE_DELAY_DAYS)
+
+async def get_history_data(city: str, start: date, end: date, location: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Past daily weather between `start` and `end` (inclusive) for a city or resolved location.
+
+    Days already in the local time-series store are served from disk; only the
+    missing ranges are fetched from the archive API and then stored.
+    """
+    try:
+        lat, lon, city_name = await _resolve(city, location)
+        if lat is None or lon is None:
+            return None
+
+        end = min(end, latest_archived_day())
+        if start > end:
+            return None
+
+        key = _coordinate_key(lat, lon)
+        for gap_start, gap_end in await history_store.missing_ranges_async(key, start, end):
+            archive_params = {
+                'latitude': lat,
+                'longitude': lon,
+                'start_date': gap_start.isoformat(),
+                'end_date': gap_end.isoformat(),
+                'daily': ','.join(HISTORY_DAILY_FIELDS),
+                'wind_speed_unit': 'ms',  # The views expect m/s
+                'timezone': 'auto'
+            }
+            daily = decode_daily(await _fetch_json(ARCHIVE_URL, archive_params), HISTORY_DAILY_FIELDS)
+            if daily is not None:
+                await history_store.append_async(key, daily)
+
+        daily = await history_store.read_async(key, start, end)
+        days = []
+        for day, max_temp, min_temp, precipitation, weather_code, wind_speed in zip(
+            daily['time'],
+            daily['temperature_2m_max'],
+            daily['temperature_2m_min'],
+            daily['precipitation_sum'],
+            daily['weather_code'],
+            daily['wind_speed_10m_max'],
+        ):
+            if is_missing(max_temp) or is_missing(min_temp):
+                continue  # The archive has no temperatures for this day
+            weather_code = 0 if is_missing(weather_code) else int(weather_code)
+            days.append({
+                'date': day,
+                'temp_max': max_temp,
+                'temp_min': min_temp,
+                'precipitation': 0 if is_missing(precipitation) else precipitation,
+                'wind_speed': 0 if is_missing(wind_speed) else wind_speed,
+                'weather': {
+                    'id': convert_wmo_to_owm_code(weather_code),
+                    'description': get_weather_description(weather_code)
+                }
+            })
+        return {'name': city_name, 'start': start.isoformat(), 'end': end.isoformat(), 'days': days}
+    except UpstreamError as e:
+        print(f"Error fetching history data: {e}")
+        return None
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error processing history data: {e}")
+        return None
+
 def calculate_feels_like(temp_c, humidity, wind_speed_ms):
     """
     Calculate feels-like temperature using a simplified heat index/wind chill formula
@@ -0,0 +1,89 @@
+"""
+Prefix index of known cities for search-as-you-type suggestions.
+"""
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from app.utils import normalize_city_name
+
+# Upper bound on prefix matches ranked per query, so short prefixes stay cheap
+MAX_SCANNED_MATCHES = 200
+
+
+def location_label(location: Dict) -> str:
+    """Human readable label for a location, e.g. 'Paris, Île-de-France, France'."""
+    parts = [location['name']]
+    for key in ('admin1', 'country'):
+        value = location.get(key)
+        if value and value not in parts:
+            parts.append(value)
+    return ', '.join(parts)
+
+
+def place_key(location: Dict) -> tuple:
+    """Identity of a place: normalized name and coordinates rounded to about a kilometre."""
+    return (
+        normalize_city_name(location['name']),
+        round(location['latitude'], 2),
+        round(location['longitude'], 2),
+    )
+
+
+def merge_suggestions(groups: Iterable[List[Dict]], limit: int) -> List[Dict]:
+    """Combine suggestion lists, keeping each place once, most populous first."""
+    merged = {}
+    for locations in groups:
+        for location in locations:
+            merged.setdefault(place_key(location), location)
+    ranked = sorted(merged.values(), key=lambda location: location.get('population') or 0, reverse=True)
+    return ranked[:limit]
+
+
+class CityIndex:
+    """
+    Sorted array of normalized city names supporting prefix lookups.
+
+    With `max_entries` set, the least recently added or suggested places are
+    evicted once the index is full.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._keys: List[tuple] = []
+        self._locations: OrderedDict = OrderedDict()
+
+    def add(self, location: Dict) -> None:
+        """Add a location; the same place (name and rounded coordinates) is only kept once."""
+        key = place_key(location)
+        if key in self._locations:
+            self._locations.move_to_end(key)
+            return
+        self._locations[key] = location
+        insort(self._keys, key)
+        while self.max_entries is not None and len(self._locations) > self.max_entries:
+            oldest, _ = self._locations.popitem(last=False)
+            del self._keys[bisect_left(self._keys, oldest)]
+
+    def add_all(self, locations: Iterable[Dict]) -> None:
+        for location in locations:
+            self.add(location)
+
+    def complete(self, prefix: str, limit: int = 5) -> List[Dict]:
+        """Return up to `limit` locations whose name starts with `prefix`, most populous first."""
+        prefix = normalize_city_name(prefix)
+        if not prefix:
+            return []
+        matches = []
+        for i in range(bisect_left(self._keys, (prefix,)), len(self._keys)):
+            key = self._keys[i]
+            if not key[0].startswith(prefix) or len(matches) >= MAX_SCANNED_MATCHES:
+                break
+            matches.append((key, self._locations[key]))
+        matches.sort(key=lambda match: match[1].get('population') or 0, reverse=True)
+        for key, _ in matches[:limit]:
+            self._locations.move_to_end(key)
+        return [location for _, location in matches[:limit]]
+
+    def __len__(self) -> int:
+        return len(self._keys)
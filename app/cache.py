@@ -0,0 +1,215 @@
+"""
+Cache backends for upstream API results.
+
+`MemoryCache` keeps entries inside the current process. `SQLiteCache` stores
+them in a local SQLite file so every worker process on a node shares the same
+geocoding and weather results. `make_cache` picks the backend configured with
+the WEATHER_CACHE_BACKEND and WEATHER_CACHE_PATH environment variables.
+
+Code on the event loop uses the `*_async` methods: they run the SQLite
+backend's file I/O in a worker thread, like the upstream fetches, and call
+the in-process backend directly.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.decoding import dumps, loads
+
+CACHE_BACKEND = os.environ.get('WEATHER_CACHE_BACKEND', 'memory')
+CACHE_PATH = os.environ.get('WEATHER_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'weather-cache.sqlite3'))
+# How long a SQLite call waits for another worker's write lock before counting as a miss
+CACHE_BUSY_TIMEOUT_MS = float(os.environ.get('WEATHER_CACHE_BUSY_TIMEOUT_MS', 100))
+
+
+class CacheBackend(ABC):
+    """Interface shared by the cache backends. Values must be JSON-serializable."""
+
+    # Whether calls do file or network I/O and must stay off the event loop
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Store a value for the backend's time-to-live."""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over the entries that have not expired yet."""
+
+    @abstractmethod
+    def expires_at(self, key: str) -> Optional[float]:
+        """Wall-clock time (as `time.time()`) the entry expires at, or None if it is missing or expired."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry."""
+
+    async def _call(self, function, *args):
+        if not self.blocking:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return await self._call(self.get, key)
+
+    async def set_async(self, key: str, value: Any) -> None:
+        await self._call(self.set, key, value)
+
+    async def items_async(self) -> List[Tuple[str, Any]]:
+        return await self._call(lambda: list(self.items()))
+
+    async def expires_at_async(self, key: str) -> Optional[float]:
+        return await self._call(self.expires_at, key)
+
+
+class MemoryCache(CacheBackend):
+    """A small in-process LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._entries.items()):
+            if expires_at > now:
+                yield key, value
+
+    def expires_at(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        remaining = None if entry is None else entry[0] - time.monotonic()
+        return None if remaining is None or remaining <= 0 else time.time() + remaining
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """One SQLite database file holding the entries of several cache namespaces."""
+
+    # Purge expired rows once every this many writes
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        import sqlite3  # Only the sqlite backend needs it; keeps the default start-up lean
+        self._operational_error = sqlite3.OperationalError
+        self._conn = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                     isolation_level=None)
+        # WAL lets readers in other worker processes proceed while one process writes
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value BLOB NOT NULL,'
+            ' PRIMARY KEY (namespace, key))'
+        )
+
+    def execute(self, sql: str, params: tuple = ()) -> list:
+        """Run one statement; while another worker holds the lock, reads miss and writes are skipped."""
+        with self._lock:
+            try:
+                return self._conn.execute(sql, params).fetchall()
+            except self._operational_error as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                print(f"Cache database busy, skipping: {e}")
+                return []
+
+    def note_write(self) -> None:
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+
+
+class SQLiteCache(CacheBackend):
+    """A cache namespace stored in a SQLite file shared by every process that opens it."""
+
+    blocking = True
+
+    def __init__(self, store: SQLiteStore, namespace: str, ttl: float):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        rows = self.store.execute(
+            'SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.namespace, key, time.time()),
+        )
+        return loads(rows[0][0]) if rows else None
+
+    def set(self, key: str, value: Any) -> None:
+        self.store.execute(
+            'INSERT OR REPLACE INTO cache (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)',
+            (self.namespace, key, time.time() + self.ttl, dumps(value)),
+        )
+        self.store.note_write()
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        rows = self.store.execute(
+            'SELECT key, value FROM cache WHERE namespace = ? AND expires_at > ?',
+            (self.namespace, time.time()),
+        )
+        for key, value in rows:
+            yield key, loads(value)
+
+    def expires_at(self, key: str) -> Optional[float]:
+        rows = self.store.execute(
+            'SELECT expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.namespace, key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    def clear(self) -> None:
+        self.store.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+
+
+_stores: Dict[str, SQLiteStore] = {}
+
+
+def make_cache(namespace: str, ttl: float, max_entries: int = 1024,
+               backend: Optional[str] = None, path: Optional[str] = None) -> CacheBackend:
+    """Create a cache for `namespace` with the configured (or given) backend."""
+    backend = backend or CACHE_BACKEND
+    if backend == 'memory':
+        return MemoryCache(ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        path = path or CACHE_PATH
+        if path not in _stores:
+            _stores[path] = SQLiteStore(path)
+        return SQLiteCache(_stores[path], namespace, ttl)
+    raise ValueError(f"Unknown cache backend: {backend!r} (expected 'memory' or 'sqlite')")
@@ -0,0 +1,167 @@
+"""
+Record/replay transport for upstream HTTP calls.
+
+In record mode every Open-Meteo exchange made through app/api.py is captured,
+with its latency, into a gzip-compressed JSON cassette. In replay mode the
+same exchanges are answered from the cassette without any network access,
+sleeping for the recorded latency so the concurrency and timing of the
+real pipeline are preserved. Configure with:
+
+    WEATHER_CASSETTE=tests/cassettes/search_pipeline.json.gz
+    WEATHER_CASSETTE_MODE=replay        # or record
+    WEATHER_CASSETTE_SPEED=1            # latency multiplier on replay, 0 = instant
+
+A recording is kept in memory and written once by `close()`, which runs at
+interpreter exit for a cassette configured from the environment.
+
+Requests match on URL path and query parameters, so a cassette recorded
+against a local stand-in replays against the default Open-Meteo hosts.
+"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+CASSETTE_PATH = os.environ.get('WEATHER_CASSETTE')
+CASSETTE_MODE = os.environ.get('WEATHER_CASSETTE_MODE', 'replay')
+CASSETTE_SPEED = float(os.environ.get('WEATHER_CASSETTE_SPEED', 1))
+
+CASSETTE_VERSION = 1
+
+# The search pipeline recording replayed by tests/test_cassette.py
+PIPELINE_CASSETTE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'tests', 'cassettes', 'search_pipeline.json.gz')
+
+
+class CassetteError(Exception):
+    """A replayed call has no recording, or replays a recorded failure."""
+
+
+def request_key(url: str, params: Dict) -> Tuple[str, Tuple]:
+    """Host-independent identity of a GET request."""
+    return urlsplit(url).path, tuple(sorted((str(name), str(value)) for name, value in params.items()))
+
+
+class Cassette:
+    """Recorded upstream exchanges, replayed in order per request."""
+
+    def __init__(self, path: str, mode: str = 'replay', speed: float = CASSETTE_SPEED):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.interactions: List[Dict] = []
+        self.hits = 0
+        self.misses = 0
+        self.played: List[Dict] = []  # Recordings served on replay, in order
+        self._lock = threading.Lock()
+        self._queues: Dict[Tuple, Deque[Dict]] = defaultdict(deque)
+        self._last: Dict[Tuple, Dict] = {}
+        if mode == 'replay':
+            self.load()
+
+    def load(self) -> None:
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            document = json.load(f)
+        if document.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version in {self.path}")
+        self.interactions = document['interactions']
+        self.rewind()
+
+    def rewind(self) -> None:
+        """Start replaying from the first recording again and reset the counters."""
+        self._queues.clear()
+        self._last.clear()
+        for interaction in self.interactions:
+            key = request_key(interaction['url'], interaction['params'])
+            self._queues[key].append(interaction)
+        self.hits = self.misses = 0
+        self.played = []
+
+    def save(self) -> None:
+        """Write the cassette atomically; fixed gzip mtime keeps the bytes reproducible."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+            f.write(json.dumps({'version': CASSETTE_VERSION, 'interactions': self.interactions},
+                               ensure_ascii=False, indent=1).encode('utf-8'))
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        """Write what was recorded; a replayed cassette has nothing to write."""
+        if self.mode == 'record':
+            with self._lock:
+                self.save()
+
+    def fetch(self, url: str, params: Dict, download: Callable[[str, Dict], bytes]) -> bytes:
+        """Answer a GET from the cassette, or perform and record it with `download`."""
+        if self.mode == 'record':
+            return self._record(url, params, download)
+        return self._replay(url, params)
+
+    def _record(self, url: str, params: Dict, download: Callable[[str, Dict], bytes]) -> bytes:
+        interaction = {'url': url, 'params': {name: str(value) for name, value in params.items()}}
+        started = time.perf_counter()
+        try:
+            content = download(url, params)
+            interaction['body'] = content.decode('utf-8')
+        except Exception as e:
+            interaction['error'] = str(e)
+            raise
+        finally:
+            interaction['elapsed'] = round(time.perf_counter() - started, 4)
+            with self._lock:
+                self.interactions.append(interaction)
+                self.hits += 1
+        return content
+
+    def _replay(self, url: str, params: Dict) -> bytes:
+        key = request_key(url, params)
+        with self._lock:
+            queue = self._queues.get(key)
+            # Repeats beyond what was recorded get the last recording again
+            interaction = queue.popleft() if queue else self._last.get(key)
+            if interaction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.played.append(interaction)
+                self._last[key] = interaction
+        if interaction is None:
+            raise CassetteError(f"No recording for {key[0]} {dict(key[1])} in {self.path}")
+        if self.speed:
+            time.sleep(interaction['elapsed'] * self.speed)  # Runs in the fetch's worker thread, like real I/O
+        if 'error' in interaction:
+            raise CassetteError(f"Recorded failure: {interaction['error']}")
+        return interaction['body'].encode('utf-8')
+
+
+_active: Optional[Cassette] = None
+_configured = False
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The cassette upstream calls go through, configured from the environment on first use."""
+    global _active, _configured
+    if not _configured:
+        _configured = True
+        if CASSETTE_PATH and _active is None:
+            _active = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+            atexit.register(_active.close)
+            print(f"Upstream calls {'recorded to' if CASSETTE_MODE == 'record' else 'replayed from'} {CASSETTE_PATH}")
+    return _active
+
+
+def use_cassette(cassette: Optional[Cassette]) -> None:
+    """Route upstream calls through `cassette`, or back to the network with None."""
+    global _active, _configured
+    _active = cassette
+    _configured = True
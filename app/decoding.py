@@ -0,0 +1,85 @@
+"""
+JSON decoding helpers for Open-Meteo responses.
+
+A faster JSON backend (orjson, then ujson) is used when one is installed;
+otherwise the standard library decoder is used.
+"""
+import json
+import math
+from array import array
+from typing import Dict, Iterable, Optional
+
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    _orjson = None
+
+try:
+    import ujson as _ujson
+except ImportError:  # pragma: no cover - depends on the environment
+    _ujson = None
+
+if _orjson is not None:
+    BACKEND = 'orjson'
+    _loads = _orjson.loads
+    _dumps = _orjson.dumps
+elif _ujson is not None:  # pragma: no cover - depends on the environment
+    BACKEND = 'ujson'
+    _loads = _ujson.loads
+    _dumps = lambda obj: _ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+else:  # pragma: no cover - depends on the environment
+    BACKEND = 'json'
+    _loads = json.loads
+    _dumps = lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+MISSING = math.nan
+
+
+def loads(content) -> Dict:
+    """Decode a JSON document given as bytes or str."""
+    return _loads(content)
+
+
+def dumps(obj) -> bytes:
+    """Encode an object as UTF-8 JSON bytes."""
+    return _dumps(obj)
+
+
+def project(payload: Dict, section: str, fields: Iterable[str]) -> Optional[Dict]:
+    """Keep only the requested fields of a payload section, or None if the section is absent."""
+    values = payload.get(section)
+    if values is None:
+        return None
+    return {field: values.get(field) for field in fields}
+
+
+def to_typed_array(values, typecode: str = 'd') -> array:
+    """Copy a decoded JSON number list into a typed array, mapping nulls to NaN."""
+    if values is None:
+        return array(typecode)
+    try:
+        return array(typecode, values)
+    except TypeError:
+        # Only pay for the per-item check when the series contains nulls
+        return array(typecode, (MISSING if value is None else value for value in values))
+
+
+def decode_daily(payload: Dict, numeric_fields: Iterable[str]) -> Optional[Dict]:
+    """
+    Project the `daily` section of a forecast payload.
+
+    `time` is kept as a list of ISO dates and every numeric field becomes an
+    `array('d')`; missing fields become empty arrays and nulls become NaN.
+    """
+    daily = payload.get('daily')
+    if daily is None:
+        return None
+    projected = {'time': daily.get('time', [])}
+    for field in numeric_fields:
+        projected[field] = to_typed_array(daily.get(field))
+    return projected
+
+
+def is_missing(value) -> bool:
+    """Check whether a decoded value is absent (None or NaN)."""
+    return value is None or (isinstance(value, float) and math.isnan(value))
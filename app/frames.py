@@ -0,0 +1,18 @@
+"""
+Telling the app's own stack frames from library frames.
+
+The profiler and the watchdog both summarize stacks by the app code in them.
+A frame is the app's when its file is under the project directory and not in
+an installed package, such as a virtualenv created inside the project.
+"""
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def is_project_file(filename: str) -> bool:
+    return filename.startswith(PROJECT_ROOT) and 'site-packages' not in filename
+
+
+def is_project_frame(frame) -> bool:
+    return is_project_file(frame.f_code.co_filename)
@@ -0,0 +1,250 @@
+"""
+Bundled city gazetteer (app/data/cities.csv) and its memory-mapped lookup index.
+
+The CSV is compiled once into a compact binary file: a header, an
+open-addressing hash table keyed by normalized city name, fixed-size city
+records, the records' normalized names in sorted order and a UTF-8 string
+blob. Lookups hash the name, probe a few slots and unpack only the matching
+records; prefix completion bisects the sorted names in place. Nothing is
+loaded into Python objects up front.
+
+Rebuild the index by hand with:
+
+    python -m app.gazetteer [cities.csv] [cities.idx]
+"""
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from app.autocomplete import MAX_SCANNED_MATCHES
+from app.utils import normalize_city_name
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'cities.csv'
+INDEX_PATH = GAZETTEER_PATH.with_suffix('.idx')
+
+MAGIC = b'WGZ2'
+# magic, record count, slot count, records offset, sorted names offset, strings offset
+HEADER = struct.Struct('<4sIIIII')
+# name hash, record number + 1 (0 marks an empty slot)
+SLOT = struct.Struct('<QI')
+# latitude, longitude, population, then offset/length of name, country and admin1
+RECORD = struct.Struct('<ddIIHIHIH')
+# offset/length of a normalized name, record number; sorted by name
+NAME = struct.Struct('<IHI')
+
+
+def iter_cities(path: Path = GAZETTEER_PATH) -> Iterator[Dict]:
+    """Yield the cities of a gazetteer CSV as location dicts."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield {
+                'name': row['name'],
+                'country': row['country'],
+                'admin1': row['admin1'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'population': int(row['population'] or 0),
+            }
+
+
+def name_hash(key: str) -> int:
+    """Stable 64-bit hash of a normalized name (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def build_index(csv_path: Path = GAZETTEER_PATH, index_path: Path = INDEX_PATH) -> int:
+    """Compile a gazetteer CSV into a binary index file and return the number of cities."""
+    strings = bytearray()
+    string_offsets: Dict[str, int] = {}
+
+    def intern(value: str):
+        encoded = value.encode('utf-8')
+        if value not in string_offsets:
+            string_offsets[value] = len(strings)
+            strings.extend(encoded)
+        return string_offsets[value], len(encoded)
+
+    records = bytearray()
+    hashes = []
+    keys = []
+    for city in iter_cities(csv_path):
+        name_off, name_len = intern(city['name'])
+        country_off, country_len = intern(city['country'])
+        admin1_off, admin1_len = intern(city['admin1'])
+        records.extend(RECORD.pack(
+            city['latitude'], city['longitude'], city['population'],
+            name_off, name_len, country_off, country_len, admin1_off, admin1_len,
+        ))
+        key = normalize_city_name(city['name'])
+        hashes.append(name_hash(key))
+        keys.append((key, len(keys)))
+
+    slot_count = 1
+    while slot_count < 2 * max(len(hashes), 1):
+        slot_count *= 2
+    slots = [(0, 0)] * slot_count
+    for record_no, h in enumerate(hashes):
+        i = h & (slot_count - 1)
+        while slots[i][1]:
+            i = (i + 1) & (slot_count - 1)
+        slots[i] = (h, record_no + 1)
+
+    names = bytearray()
+    for key, record_no in sorted(keys):
+        key_off, key_len = intern(key)
+        names.extend(NAME.pack(key_off, key_len, record_no))
+
+    records_offset = HEADER.size + slot_count * SLOT.size
+    names_offset = records_offset + len(records)
+    strings_offset = names_offset + len(names)
+    tmp_path = Path(f'{index_path}.tmp{os.getpid()}')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(hashes), slot_count, records_offset, names_offset, strings_offset))
+        for h, ref in slots:
+            f.write(SLOT.pack(h, ref))
+        f.write(records)
+        f.write(names)
+        f.write(strings)
+    os.replace(tmp_path, index_path)  # Readers never see a half-written index
+    return len(hashes)
+
+
+class GazetteerIndex:
+    """Read-only view over a compiled gazetteer index file."""
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self._slot_count, self._records_offset, self._names_offset, self._strings_offset = \
+            HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer index")
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return self._buf[start:start + length].decode('utf-8')
+
+    def _record(self, record_no: int) -> Dict:
+        lat, lon, population, name_off, name_len, country_off, country_len, admin1_off, admin1_len = \
+            RECORD.unpack_from(self._buf, self._records_offset + record_no * RECORD.size)
+        return {
+            'name': self._string(name_off, name_len),
+            'country': self._string(country_off, country_len),
+            'admin1': self._string(admin1_off, admin1_len),
+            'latitude': lat,
+            'longitude': lon,
+            'population': population,
+        }
+
+    def lookup(self, name: str) -> List[Dict]:
+        """
+        Return every city called `name`, most populous first.
+
+        A qualifier after a comma ("Paris, Texas") keeps only the cities whose
+        region or country starts with it.
+        """
+        name, _, qualifier = name.partition(',')
+        key = normalize_city_name(name)
+        if not key:
+            return []
+        h = name_hash(key)
+        mask = self._slot_count - 1
+        i = h & mask
+        matches = []
+        while True:
+            slot_hash, ref = SLOT.unpack_from(self._buf, HEADER.size + i * SLOT.size)
+            if not ref:
+                break
+            if slot_hash == h:
+                city = self._record(ref - 1)
+                if normalize_city_name(city['name']) == key:
+                    matches.append(city)
+            i = (i + 1) & mask
+        qualifier = normalize_city_name(qualifier)
+        if qualifier:
+            matches = [
+                city for city in matches
+                if normalize_city_name(city['admin1']).startswith(qualifier)
+                or normalize_city_name(city['country']).startswith(qualifier)
+            ]
+        matches.sort(key=lambda city: city['population'], reverse=True)
+        return matches
+
+    def _name(self, position: int):
+        """Normalized name and record number at `position` in sorted name order."""
+        key_off, key_len, record_no = NAME.unpack_from(self._buf, self._names_offset + position * NAME.size)
+        return self._string(key_off, key_len), record_no
+
+    def complete(self, prefix: str, limit: int = 5) -> List[Dict]:
+        """Return up to `limit` cities whose name starts with `prefix`, most populous first."""
+        prefix = normalize_city_name(prefix)
+        if not prefix:
+            return []
+        # Bisect the sorted names in the mapped file for the first one >= prefix
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid)[0] < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = []
+        for position in range(lo, min(self.size, lo + MAX_SCANNED_MATCHES)):
+            key, record_no = self._name(position)
+            if not key.startswith(prefix):
+                break
+            matches.append(self._record(record_no))
+        matches.sort(key=lambda city: city['population'], reverse=True)
+        return matches[:limit]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for record_no in range(self.size):
+            yield self._record(record_no)
+
+    def close(self) -> None:
+        self._buf.close()
+
+
+_index: Optional[GazetteerIndex] = None
+
+
+def _is_stale(index_path: Path, csv_path: Path) -> bool:
+    if not index_path.exists() or index_path.stat().st_mtime < csv_path.stat().st_mtime:
+        return True
+    # Written by an older version of the file format
+    with open(index_path, 'rb') as f:
+        return f.read(len(MAGIC)) != MAGIC
+
+
+def get_index() -> Optional[GazetteerIndex]:
+    """
+    Return the shared gazetteer index, compiling it from the CSV on first use if needed.
+
+    Falls back to the temp directory when the package directory is read-only and
+    returns None when no index can be built, so callers just go remote.
+    """
+    global _index
+    if _index is not None:
+        return _index
+    for index_path in (INDEX_PATH, Path(tempfile.gettempdir()) / 'weather-cities.idx'):
+        try:
+            if _is_stale(index_path, GAZETTEER_PATH):
+                build_index(GAZETTEER_PATH, index_path)
+            _index = GazetteerIndex(index_path)
+            return _index
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading gazetteer index {index_path}: {e}")
+    return None
+
+
+if __name__ == '__main__':
+    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else GAZETTEER_PATH
+    index_path = Path(sys.argv[2]) if len(sys.argv) > 2 else csv_path.with_suffix('.idx')
+    count = build_index(csv_path, index_path)
+    print(f"Wrote {count} cities to {index_path}")
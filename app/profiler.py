@@ -0,0 +1,138 @@
+"""
+Opt-in sampling profiler for diagnosing a live app process.
+
+While a profiling window is open, a daemon thread samples the stacks of all
+threads with sys._current_frames() at a fixed rate and counts them in the
+collapsed ("folded") format that flamegraph.pl, speedscope and inferno read:
+
+    serve;handle_search;[fetch] get_weather_data;_fetch_json 12
+
+App frames get a category tag on their first appearance so time is
+attributed to `serve` handlers, app/api.py fetches and view builders.
+Library frames are kept as module:function.
+
+Start a window with WEATHER_PROFILE_SECONDS at startup, or at run time from
+the admin route (see main.py); no restart is needed.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from app.frames import is_project_file
+
+PROFILE_SECONDS = float(os.environ.get('WEATHER_PROFILE_SECONDS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('WEATHER_PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('WEATHER_PROFILE_DIR', tempfile.gettempdir())
+
+
+def frame_category(filename: str, function: str) -> Optional[str]:
+    """Tag app frames: serve handlers, upstream fetches and view builders."""
+    if not is_project_file(filename):
+        return None
+    if filename.endswith(os.path.join('app', 'api.py')):
+        return 'fetch'
+    if filename.endswith('main.py'):
+        if function == 'serve' or function.startswith('handle_'):
+            return 'handler'
+        if function.endswith('_view') or function == 'main_app':
+            return 'view'
+    return None
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    category = frame_category(code.co_filename, code.co_name)
+    if category is not None:
+        return f"[{category}] {code.co_name}"
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{code.co_name}"
+
+
+def collapse(frame) -> str:
+    """Folded stack for one sample, outermost frame first."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class SamplingProfiler:
+    """Samples every thread's stack for a bounded window and writes folded stacks."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, output_dir: str = PROFILE_DIR):
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.samples: Counter = Counter()
+        self.last_output: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float) -> bool:
+        """Open a profiling window; returns False if one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self.samples = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, seconds: float) -> None:
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        started = time.time()
+        while time.monotonic() < deadline and not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = collapse(frame)
+                # Idle worker threads only wait on a lock or selector; keep the output focused
+                if stack.endswith(('threading:wait', 'selectors:select', 'queue:get', 'threading:_wait_for_tstate_lock')):
+                    continue
+                stacks.append(stack)
+            # summary() reads the counts from the event loop while this thread samples
+            with self._lock:
+                self.samples.update(stacks)
+        self.last_output = self.write(os.path.join(self.output_dir, f'weather-profile-{int(started)}.folded'))
+        print(f"Profile written to {self.last_output} ({sum(self.snapshot().values())} samples)")
+
+    def snapshot(self) -> Counter:
+        """A copy of the sample counts, safe to read while sampling goes on."""
+        with self._lock:
+            return Counter(self.samples)
+
+    def write(self, path: str) -> str:
+        """Write collected samples in collapsed-stack format and return the path."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.snapshot().most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def summary(self, top: int = 10) -> Dict[str, int]:
+        """Sample counts per tagged app frame (inclusive), most expensive first."""
+        totals: Counter = Counter()
+        for stack, count in self.snapshot().items():
+            for name in {part for part in stack.split(';') if part.startswith('[')}:
+                totals[name] += count
+        return dict(totals.most_common(top))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,165 @@
+"""
+Per-client session state with idle compaction and a memory budget.
+
+Wave keeps a `q.client` expando per browser tab. The app keeps its own state
+in a slotted `SessionState` held by a `SessionStore`, keyed by the client's
+page. Entries go away only when Wave drops the client on disconnect. A client
+idle longer than the TTL, or seen least recently while the store is over its
+memory budget, may still be connected, so it only loses the cached results it
+can fetch again; its preferences and favorites stay. State kept outside the store, such as alert
+rules, registers a disconnect hook and lives until the client is gone.
+"""
+import asyncio
+import os
+import sys
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+SESSION_IDLE_SECONDS = float(os.environ.get('WEATHER_SESSION_IDLE_SECONDS', 30 * 60))
+SESSION_MEMORY_BUDGET = int(os.environ.get('WEATHER_SESSION_MEMORY_BUDGET', 64 * 1024 * 1024))
+SESSION_SWEEP_SECONDS = float(os.environ.get('WEATHER_SESSION_SWEEP_SECONDS', 60))
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Approximate memory footprint of an object and everything it references."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class SessionState:
+    """Everything the app remembers about one browser client."""
+
+    __slots__ = (
+        'initialized',
+        'temperature_unit',
+        'theme',
+        'favorite_locations',
+        'location',
+        'location_candidates',
+        'suggestions',
+        'suggest_seq',
+        'last_seen',
+    )
+
+    # Results that can be fetched again and are dropped when compacting
+    CACHED_FIELDS = ('location_candidates', 'suggestions')
+
+    def __init__(self):
+        self.initialized = False
+        self.temperature_unit = 'C'
+        self.theme = 'h2o-dark'
+        self.favorite_locations = []
+        self.location = None
+        self.location_candidates = None
+        self.suggestions = None
+        self.suggest_seq = 0
+        self.last_seen = time.monotonic()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__slots__ and getattr(self, name, None) is not None
+
+    def compact(self) -> bool:
+        """Drop cached results that can be fetched again; returns whether there were any."""
+        cached = any(getattr(self, name) is not None for name in self.CACHED_FIELDS)
+        for name in self.CACHED_FIELDS:
+            setattr(self, name, None)
+        return cached
+
+
+class SessionStore:
+    """Live sessions keyed by client page, compacted when idle or over the memory budget."""
+
+    def __init__(self, idle_seconds: float = SESSION_IDLE_SECONDS, memory_budget: int = SESSION_MEMORY_BUDGET):
+        self.idle_seconds = idle_seconds
+        self.memory_budget = memory_budget
+        self._sessions: Dict[str, SessionState] = {}
+        self._disconnect_hooks: List[Callable[[str], object]] = []
+
+    def attach(self, q) -> SessionState:
+        """Return the session of the client behind `q`, creating it on first contact."""
+        if isinstance(q.client, SessionState):
+            q.client.last_seen = time.monotonic()
+            return q.client  # Already attached for this query
+        key = q.page.url
+        state = self._sessions.get(key)
+        if state is None:
+            state = SessionState()
+            self._sessions[key] = state
+            # Wave forgets q.client when the browser disconnects; forget the session with it
+            weakref.finalize(q.client, self.disconnect, key)
+        state.last_seen = time.monotonic()
+        return state
+
+    def discard(self, key: str) -> None:
+        self._sessions.pop(key, None)
+
+    def on_disconnect(self, hook: Callable[[str], object]) -> None:
+        """Call `hook(key)` when a client disconnects."""
+        self._disconnect_hooks.append(hook)
+
+    def disconnect(self, key: str) -> None:
+        self.discard(key)
+        for hook in self._disconnect_hooks:
+            hook(key)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def memory_bytes(self) -> int:
+        """Gauge: approximate memory held by all live sessions."""
+        return sum(deep_sizeof(state) for state in self._sessions.values())
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Compact sessions idle longer than the TTL, then enforce the memory budget.
+
+        Over budget, cached results are dropped from the least recently seen
+        sessions first. Whole sessions are never evicted: their clients may
+        still be connected and would lose their settings mid-visit.
+        Returns the number of sessions compacted.
+        """
+        now = time.monotonic() if now is None else now
+        compacted = {key for key, state in self._sessions.items()
+                     if now - state.last_seen > self.idle_seconds and state.compact()}
+
+        used = self.memory_bytes()
+        if used <= self.memory_budget:
+            return len(compacted)
+        for key, state in sorted(self._sessions.items(), key=lambda item: item[1].last_seen):
+            before = deep_sizeof(state)
+            if state.compact():
+                compacted.add(key)
+                used -= before - deep_sizeof(state)
+            if used <= self.memory_budget:
+                break
+        return len(compacted)
+
+    async def run_sweeper(self, interval: float = SESSION_SWEEP_SECONDS) -> None:
+        """Sweep periodically and report the live-session gauge."""
+        from app.watchdog import watchdog
+        while True:
+            await asyncio.sleep(interval)
+            compacted = self.sweep()
+            lag = watchdog.stats()
+            print(f"Sessions: {len(self)} live, {self.memory_bytes()} bytes, {compacted} compacted; "
+                  f"loop lag {lag['lag_ms']} ms (max {lag['max_lag_ms']} ms, {lag['stalls']} stalls)")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+sessions = SessionStore()
@@ -0,0 +1,82 @@
+"""
+Grid-bucket spatial index for finding cached results near a coordinate.
+"""
+import math
+from typing import Dict, Iterator, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """Buckets keyed points into fixed-size latitude/longitude cells."""
+
+    def __init__(self, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        # Longitude cells around the globe; cell indexes wrap so ±180° are neighbours
+        self.lon_cells = math.ceil(round(360 / cell_degrees, 9))
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._points: Dict[str, Tuple[int, int]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees) % self.lon_cells
+
+    def add(self, key: str, lat: float, lon: float) -> None:
+        """Index a point, replacing any previous position stored under the same key."""
+        self.discard(key)
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[key] = (lat, lon)
+        self._points[key] = cell
+
+    def discard(self, key: str) -> None:
+        cell = self._points.pop(key, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> Iterator[Tuple[float, str]]:
+        """Yield (distance_km, key) for every point within `radius_km`, nearest first."""
+        if radius_km < 0:
+            return
+        lat_cells = math.ceil(radius_km / KM_PER_DEGREE / self.cell_degrees)
+        # Longitude degrees shrink towards the poles, so widen the scan accordingly
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_cells * self.cell_degrees, 89.9))), 1e-6)
+        lon_cells = math.ceil(radius_km / (KM_PER_DEGREE * cos_lat) / self.cell_degrees)
+        center_i, center_j = self._cell(lat, lon)
+        # Near the poles the scan may cover every longitude cell; visit each once
+        if 2 * lon_cells + 1 >= self.lon_cells:
+            lon_range = range(self.lon_cells)
+        else:
+            lon_range = [j % self.lon_cells for j in range(center_j - lon_cells, center_j + lon_cells + 1)]
+        found = []
+        for i in range(center_i - lat_cells, center_i + lat_cells + 1):
+            for j in lon_range:
+                for key, (point_lat, point_lon) in self._cells.get((i, j), {}).items():
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance <= radius_km:
+                        found.append((distance, key))
+        found.sort()
+        yield from found
+
+    def nearest(self, lat: float, lon: float, radius_km: float) -> Optional[Tuple[float, str]]:
+        """Return (distance_km, key) of the closest point within `radius_km`, if any."""
+        return next(self.within(lat, lon, radius_km), None)
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._points.clear()
+
+    def __len__(self) -> int:
+        return len(self._points)
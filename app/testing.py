@@ -0,0 +1,60 @@
+"""
+Stand-ins for Wave's page and query objects that drive serve() end to end.
+
+Unlike the `MockQ` of the unit tests they use Wave's real `Expando` and card
+objects, and dump every changed card on save the way Wave serializes it, so
+rendering costs what it does in production. The cassette tests, the load
+test and the start-up benchmark share them.
+"""
+import time
+
+
+class FakePage(dict):
+    """Dict-backed page that dumps changed cards on save, roughly like Wave does."""
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._changed = []
+        self.saves = 0
+
+    def __setitem__(self, key, card):
+        super().__setitem__(key, card)
+        self._changed.append(card)
+
+    async def save(self):
+        for card in self._changed:
+            card.dump()
+        self._changed.clear()
+        self.saves += 1
+
+
+class FakeQ:
+    """The parts of h2o_wave.Q that serve() touches."""
+
+    def __init__(self, page: FakePage, client, args: dict):
+        from h2o_wave.core import Expando
+        self.page = page
+        self.client = client
+        self.args = Expando(args)
+        self.events = Expando()
+
+
+async def run_searches(searches) -> list:
+    """Search each city in a fresh session with cold caches; returns (city, seconds, upstream calls, page)."""
+    from h2o_wave.core import Expando
+    import main
+    from app import api
+    from app.cassette import get_cassette
+
+    api.clear_caches()
+    cassette = get_cassette()
+    results = []
+    for n, city in enumerate(searches):
+        page, client = FakePage(f'/cassette-{n}'), Expando()
+        await main.serve(FakeQ(page, client, {}))
+        calls = cassette.hits
+        started = time.perf_counter()
+        await main.serve(FakeQ(page, client, {'search': city, 'search_button': True}))
+        results.append((city, time.perf_counter() - started, cassette.hits - calls, page))
+    return results
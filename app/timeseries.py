@@ -0,0 +1,208 @@
+"""
+Append-only columnar store for daily weather history.
+
+Past weather never changes, so archive days are fetched once and kept on
+disk. Each location (rounded coordinate key) has its own directory with one
+binary column file per field plus a `day` column of date ordinals:
+
+    <root>/51.51_-0.13/day.i32
+    <root>/51.51_-0.13/temperature_2m_max.f64
+    ...
+
+Rows are only ever appended, in whatever order ranges were fetched, and a
+day that is already stored is never written again. Days lacking a required
+field (the archive has not filled them in yet) are not stored, and a day
+stored incomplete by an older version counts as missing until a complete
+row for it is appended; the latest row of a day wins. After a crash mid-append
+the columns are cut back to the length they all share when the series is
+next loaded.
+
+Worker processes may share the directory: every operation on a location
+holds an exclusive `flock` on its `.lock` file, and a series another process
+has appended to since it was loaded is read again from disk first. Code on
+the event loop uses the `*_async` methods, which wait for that lock and do
+the file I/O in a worker thread, like the SQLite cache backend.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock: run a single process per history directory
+    fcntl = None
+
+from app.decoding import MISSING, is_missing
+
+HISTORY_DIR = os.environ.get('WEATHER_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'weather-history'))
+
+DAY_COLUMN = 'day.i32'
+LOCK_FILE = '.lock'
+
+
+class Series:
+    """The loaded columns of one location, with a day-ordinal to row lookup."""
+
+    def __init__(self, fields: Iterable[str]):
+        self.days = array('i')
+        self.columns: Dict[str, array] = {field: array('d') for field in fields}
+        self.rows: Dict[int, int] = {}
+
+
+class TimeSeriesStore:
+    """Daily series per location key, persisted as append-only column files."""
+
+    def __init__(self, root: str, fields: Iterable[str], required: Iterable[str] = ()):
+        self.root = root
+        self.fields = tuple(fields)
+        self.required = tuple(required)  # Fields a day must have to count as stored
+        self._series: Dict[str, Series] = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, key: str) -> str:
+        return os.path.join(self.root, key.replace(',', '_'))
+
+    def _files(self, key: str) -> Dict[str, str]:
+        directory = self._directory(key)
+        files = {field: os.path.join(directory, f'{field}.f64') for field in self.fields}
+        files['day'] = os.path.join(directory, DAY_COLUMN)
+        return files
+
+    @contextmanager
+    def _locked(self, key: str):
+        """Hold the key against other threads and, through flock, other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = self._directory(key)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, key: str) -> Series:
+        """The series of a key, read again if another process appended to it. Call with the key locked."""
+        files = self._files(key)
+        series = self._series.get(key)
+        if series is not None:
+            stored_days = os.path.getsize(files['day']) // series.days.itemsize if os.path.exists(files['day']) else 0
+            if stored_days == len(series.days):
+                return series
+        series = Series(self.fields)
+        columns = dict(series.columns, day=series.days)
+        present = [name for name, path in files.items() if os.path.exists(path)]
+        for name in present:
+            with open(files[name], 'rb') as f:
+                columns[name].frombytes(f.read())
+        # No day column means no row was ever completed
+        rows = min(len(columns[name]) for name in present) if 'day' in present else 0
+        for name, column in columns.items():
+            if name not in present and rows:
+                # A field added after these days were stored: its values are unknown
+                column.extend(array('d', [MISSING]) * rows)
+                with open(files[name], 'wb') as f:
+                    column.tofile(f)
+            elif len(column) > rows:
+                # An interrupted append left this column longer than the others
+                del column[rows:]
+                os.truncate(files[name], rows * column.itemsize)
+        series.rows = {day: row for row, day in enumerate(series.days)}
+        self._series[key] = series
+        return series
+
+    def _complete(self, series: Series, ordinal: int) -> bool:
+        row = series.rows.get(ordinal)
+        return row is not None and not any(is_missing(series.columns[field][row]) for field in self.required)
+
+    def missing_ranges(self, key: str, start: date, end: date) -> List[Tuple[date, date]]:
+        """Inclusive date ranges between `start` and `end` that are not stored (complete) yet."""
+        with self._locked(key):
+            series = self._load(key)
+            stored = {ordinal for ordinal in range(start.toordinal(), end.toordinal() + 1)
+                      if self._complete(series, ordinal)}
+        gaps = []
+        gap_start = None
+        for ordinal in range(start.toordinal(), end.toordinal() + 1):
+            if ordinal not in stored:
+                gap_start = ordinal if gap_start is None else gap_start
+            elif gap_start is not None:
+                gaps.append((date.fromordinal(gap_start), date.fromordinal(ordinal - 1)))
+                gap_start = None
+        if gap_start is not None:
+            gaps.append((date.fromordinal(gap_start), end))
+        return gaps
+
+    def append(self, key: str, daily: Dict) -> int:
+        """
+        Append the days of a decoded `daily` section that are not stored yet.
+
+        `daily` has the shape returned by `decode_daily`: a `time` list of ISO
+        dates and one array per field. Days missing a required field are
+        skipped. Returns the number of rows written.
+        """
+        def value(field, i):
+            values = daily.get(field)
+            return values[i] if values is not None and i < len(values) else MISSING
+
+        with self._locked(key):
+            series = self._load(key)
+            new_rows = [i for i, day in enumerate(daily['time'])
+                        if not self._complete(series, date.fromisoformat(day).toordinal())
+                        and not any(is_missing(value(field, i)) for field in self.required)]
+            if not new_rows:
+                return 0
+            days = array('i', (date.fromisoformat(daily['time'][i]).toordinal() for i in new_rows))
+            columns = {field: array('d', (value(field, i) for i in new_rows)) for field in self.fields}
+            os.makedirs(self._directory(key), exist_ok=True)
+            files = self._files(key)
+            # Field columns first, the day column last: a row only counts once its day is written
+            for field, column in columns.items():
+                with open(files[field], 'ab') as f:
+                    column.tofile(f)
+            with open(files['day'], 'ab') as f:
+                days.tofile(f)
+            for field, column in columns.items():
+                series.columns[field].extend(column)
+            for day in days:
+                series.rows[day] = len(series.days)
+                series.days.append(day)
+            return len(new_rows)
+
+    def read(self, key: str, start: date, end: date) -> Dict:
+        """Stored days between `start` and `end` in date order, shaped like `decode_daily` output."""
+        with self._locked(key):
+            series = self._load(key)
+            rows = [series.rows[ordinal] for ordinal in range(start.toordinal(), end.toordinal() + 1)
+                    if ordinal in series.rows]
+            result = {'time': [date.fromordinal(series.days[row]).isoformat() for row in rows]}
+            for field in self.fields:
+                column = series.columns[field]
+                result[field] = array('d', (column[row] for row in rows))
+            return result
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def missing_ranges_async(self, key: str, start: date, end: date) -> List[Tuple[date, date]]:
+        return await self._call(self.missing_ranges, key, start, end)
+
+    async def append_async(self, key: str, daily: Dict) -> int:
+        return await self._call(self.append, key, daily)
+
+    async def read_async(self, key: str, start: date, end: date) -> Dict:
+        return await self._call(self.read, key, start, end)
+
+    def clear(self) -> None:
+        """Forget loaded series; the files on disk stay."""
+        with self._lock:
+            self._series.clear()
+
@@ -1,3 +1,5 @@
+import unicodedata
+
 def convert_temperature(temp: float, unit: str) -> float:
     """Convert temperature between Celsius and Fahrenheit."""
     if unit == 'F':
@@ -64,4 +66,10 @@ def celsius_to_fahrenheit(celsius: float) -> float:
 
 def fahrenheit_to_celsius(fahrenheit: float) -> float:
     """Convert Fahrenheit to Celsius."""
-    return round((fahrenheit - 32) * 5/9, 1)
\ No newline at end of file
+    return round((fahrenheit - 32) * 5/9, 1)
+
+def normalize_city_name(name: str) -> str:
+    """Normalize a city name for lookups: casefold, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize('NFKD', name.casefold())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.replace('-', ' ').split())
@@ -0,0 +1,133 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat coroutine stamps the time on every loop iteration it gets. A
+daemon thread checks that stamp; when the loop has not come back for longer
+than the threshold, it grabs the loop thread's current stack and, once the
+loop recovers, reports how long it was blocked and where, e.g.
+
+    Event loop blocked for 412 ms: serve → handle_search → get_coordinates → requests.get
+
+The thread only reads a float between sleeps, so it is cheap enough to leave
+on in production.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from app.frames import is_project_frame
+
+WATCHDOG_ENABLED = os.environ.get('WEATHER_WATCHDOG', '1') != '0'
+WATCHDOG_THRESHOLD_MS = float(os.environ.get('WEATHER_WATCHDOG_THRESHOLD_MS', 100))
+
+
+def _frame_label(frame) -> str:
+    """Project frames by function name, library frames as package.function (e.g. requests.get)."""
+    if is_project_frame(frame):
+        return frame.f_code.co_name
+    package = frame.f_globals.get('__name__', '?').split('.')[0]
+    return f"{package}.{frame.f_code.co_name}"
+
+
+def blocking_chain(frame) -> List[str]:
+    """
+    Summarize a stack as the app frames leading to the blocking call.
+
+    Keeps every project frame, outermost first, followed by the first
+    library frame they called into; the rest of the library stack is noise.
+    """
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    chain = []
+    last_project = None
+    for i, frame in enumerate(stack):
+        if is_project_frame(frame):
+            chain.append(_frame_label(frame))
+            last_project = i
+    if last_project is None:
+        return [_frame_label(frame) for frame in stack[-3:]]
+    if last_project + 1 < len(stack):
+        chain.append(_frame_label(stack[last_project + 1]))
+    return chain
+
+
+class LoopWatchdog:
+    """Measures event-loop lag continuously and reports callbacks that block it."""
+
+    def __init__(self, threshold_ms: float = WATCHDOG_THRESHOLD_MS, interval_ms: Optional[float] = None,
+                 max_reports: int = 50):
+        self.threshold = threshold_ms / 1000
+        self.interval = (interval_ms if interval_ms is not None else threshold_ms / 2) / 1000
+        self.reports: Deque[Dict] = deque(maxlen=max_reports)
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.stalls = 0
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        """Start watching the running event loop; call from inside it."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        return self._task
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self._last_tick = now
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                # The loop was due back one interval after its last tick
+                self._report(pending, max(0.0, now - pending['since'] - self.interval))
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            since = self._last_tick
+            if self._pending is None and time.monotonic() - since > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                # Skip if the loop ticked while we were looking; the stack would be innocent
+                if frame is not None and self._last_tick == since:
+                    self._pending = {'since': since, 'chain': blocking_chain(frame)}
+
+    def _report(self, pending: Dict, blocked: float) -> None:
+        self.stalls += 1
+        report = {'blocked_ms': round(blocked * 1000, 1), 'chain': pending['chain'], 'at': time.time()}
+        self.reports.append(report)
+        print(f"Event loop blocked for {report['blocked_ms']:.0f} ms: {' → '.join(report['chain'])}")
+
+    def stats(self) -> Dict:
+        """Current lag figures for dashboards and logs."""
+        return {
+            'lag_ms': round(self.last_lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'stalls': self.stalls,
+        }
+
+
+watchdog = LoopWatchdog()
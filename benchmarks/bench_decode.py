@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for the JSON decoding path on recorded Open-Meteo payloads.
+
+Run from the project root:
+
+    python -m benchmarks.bench_decode
+"""
+import json
+import timeit
+from pathlib import Path
+
+from app.api import FORECAST_DAILY_FIELDS
+from app.decoding import BACKEND, decode_daily, loads
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+PAYLOADS = ['geocoding_london.json', 'current_london.json', 'forecast_london.json']
+NUMBER = 20000
+
+
+def stdlib_daily(content: bytes):
+    """Baseline: full stdlib decode, then index the daily lists."""
+    daily = json.loads(content)['daily']
+    return [daily[field] for field in FORECAST_DAILY_FIELDS]
+
+
+def fast_daily(content: bytes):
+    """Fast path: backend decode, then project the daily fields into typed arrays."""
+    return decode_daily(loads(content), FORECAST_DAILY_FIELDS)
+
+
+def bench(label: str, func, content: bytes) -> float:
+    seconds = min(timeit.repeat(lambda: func(content), number=NUMBER, repeat=5))
+    per_call_us = seconds / NUMBER * 1e6
+    print(f"  {label:<28} {per_call_us:8.2f} us/call")
+    return per_call_us
+
+
+def main():
+    print(f"JSON backend: {BACKEND}")
+    for name in PAYLOADS:
+        content = (FIXTURES / name).read_bytes()
+        print(f"{name} ({len(content)} bytes)")
+        baseline = bench('json.loads', json.loads, content)
+        fast = bench(f'{BACKEND}.loads', loads, content)
+        print(f"  speedup: {baseline / fast:.2f}x")
+
+    content = (FIXTURES / 'forecast_london.json').read_bytes()
+    print('daily projection')
+    baseline = bench('json.loads + lists', stdlib_daily, content)
+    fast = bench(f'{BACKEND} + typed arrays', fast_daily, content)
+    print(f"  speedup: {baseline / fast:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
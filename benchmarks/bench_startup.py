@@ -0,0 +1,84 @@
+"""
+Start-up benchmark: cold import time of the app and first-render latency.
+
+Every sample runs in a fresh interpreter so nothing is warm. It measures how
+long `import main` takes, and then how long serve() takes to render the first
+client's page and a second client's page, with the FakePage/FakeQ stand-ins
+of app/testing.py. It also lists the slowest top-level imports reported by
+`python -X importtime`.
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = '''
+import asyncio, contextlib, io, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from h2o_wave.core import Expando
+from app.testing import FakePage, FakeQ
+
+async def render(n):
+    page = FakePage(f'/startup-{n}')
+    began = time.perf_counter()
+    await main.serve(FakeQ(page, Expando(), {}))
+    return time.perf_counter() - began
+
+with contextlib.redirect_stdout(io.StringIO()):
+    first = asyncio.run(render(1))
+    second = asyncio.run(render(2))
+print(json.dumps({'import': imported - started, 'first_render': first, 'next_render': second,
+                  'requests_loaded': 'requests' in __import__('sys').modules}))
+'''
+
+
+def run_child() -> dict:
+    env = dict(os.environ, WEATHER_WATCHDOG='0')
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> list:
+    """(cumulative microseconds, module) of the slowest top-level imports of main."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        # Top-level imports of main are indented by exactly two spaces
+        if len(parts) == 3 and parts[2].startswith('   ') and not parts[2].startswith('    '):
+            rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters to sample')
+    parser.add_argument('--top', type=int, default=8, help='slowest imports to list')
+    args = parser.parse_args()
+
+    samples = [run_child() for _ in range(args.runs)]
+    for key, label in [('import', 'import main'), ('first_render', 'first client render'),
+                       ('next_render', 'next client render')]:
+        values = [sample[key] * 1000 for sample in samples]
+        print(f"{label:<22} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+    print(f"requests imported before the first search: {any(s['requests_loaded'] for s in samples)}")
+
+    print('\nSlowest imports of main (cumulative):')
+    for micros, module in slowest_imports(args.top):
+        print(f"  {module:<24} {micros / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Record or replay the full search pipeline through an upstream cassette.
+
+`record` drives serve() for a few searches against the local Open-Meteo
+stand-in (or the real service with --live) and captures every upstream
+exchange with its latency. `replay` runs the same searches offline from the
+cassette with the recorded timing and reports per-search latency and
+upstream calls; tests/test_cassette.py asserts budgets on the same run.
+
+    python -m benchmarks.cassette_pipeline record
+    python -m benchmarks.cassette_pipeline replay --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from app.cassette import PIPELINE_CASSETTE
+from app.testing import run_searches
+
+# Gazetteer cities (no geocoding call), an ambiguous name and one only the geocoding API knows
+SEARCHES = ['London', 'Paris', 'Springfield', 'Oakhaven']
+
+
+def record(args) -> None:
+    from benchmarks.openmeteo_stub import OpenMeteoStub
+    stub = None
+    if not args.live:
+        stub = OpenMeteoStub(latency=args.upstream_latency_ms / 1000).start()
+        os.environ['OPEN_METEO_BASE_URL'] = stub.base_url
+        os.environ['OPEN_METEO_GEOCODING_URL'] = f"{stub.base_url}/search"
+        os.environ['OPEN_METEO_AIR_QUALITY_URL'] = f"{stub.base_url}/air-quality"
+        os.environ['OPEN_METEO_ARCHIVE_URL'] = f"{stub.base_url}/archive"
+    from app.cassette import Cassette, use_cassette
+    cassette = Cassette(str(args.cassette), mode='record')
+    use_cassette(cassette)
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            asyncio.run(run_searches(SEARCHES))
+    finally:
+        cassette.close()
+        if stub is not None:
+            stub.stop()
+    print(f"Recorded {len(cassette.interactions)} exchanges to {args.cassette}")
+
+
+def replay(args) -> None:
+    from app.cassette import Cassette, use_cassette
+    cassette = Cassette(str(args.cassette), mode='replay', speed=args.speed)
+    use_cassette(cassette)
+    timings = {city: [] for city in SEARCHES}
+    upstream = {}
+    for _ in range(args.rounds):
+        cassette.rewind()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            results = asyncio.run(run_searches(SEARCHES))
+        for city, seconds, calls, _ in results:
+            timings[city].append(seconds * 1000)
+            upstream[city] = calls
+    print(f"{'search':<14} {'median ms':>10} {'max ms':>8} {'upstream':>9}")
+    for city, values in timings.items():
+        print(f"{city:<14} {statistics.median(values):>10.1f} {max(values):>8.1f} {upstream[city]:>9}")
+    print(f"cassette misses: {cassette.misses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--cassette', type=Path, default=Path(PIPELINE_CASSETTE))
+    parser.add_argument('--live', action='store_true', help='record against the real Open-Meteo service')
+    parser.add_argument('--upstream-latency-ms', type=float, default=30, help='stand-in latency when recording')
+    parser.add_argument('--speed', type=float, default=1, help='replay latency multiplier, 0 = instant')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+    record(args) if args.mode == 'record' else replay(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Load-test driver: simulates many concurrent Wave sessions against serve().
+
+Each simulated browser gets its own client state and page: the `FakePage`
+and `FakeQ` stand-ins of app/testing.py, built on Wave's real `Expando`
+and card objects. It plays a realistic mix of searches (typing, then
+pressing Search), unit toggles, theme toggles and clears against the local Open-Meteo stand-in
+(benchmarks/openmeteo_stub.py). Concurrency is ramped level by level and the
+report shows throughput, serve() latency, event-loop lag, memory per session
+and the knee of the latency curve: the level with the best throughput to p95
+latency ratio, beyond which extra load mostly buys queueing.
+
+Latency is recorded per action. Search-as-you-type events include the
+server-side suggestion debounce, a deliberate wait rather than work, so they
+are reported in their own column and left out of the percentiles that
+locate the knee.
+
+    python -m benchmarks.load_test --levels 1,4,16,64,256,1024 --actions 6
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from app.testing import FakePage, FakeQ
+from benchmarks.openmeteo_stub import OpenMeteoStub
+
+# (action, weight) of a user's next interaction
+ACTION_MIX = [('search', 5), ('toggle_unit', 2), ('toggle_theme', 2), ('clear', 1)]
+# Mostly gazetteer cities, plus names only the (stand-in) geocoding API knows
+CITIES = ['London', 'Paris', 'Tokyo', 'New York', 'Berlin', 'Sydney', 'Springfield', 'Cairo',
+          'Lima', 'Toronto', 'Oakhaven', 'Port Ellis', 'Westbrook', 'Linfield']
+
+
+# Actions whose serve() time is mostly the deliberate suggestion debounce
+DEBOUNCED_ACTIONS = ('suggest',)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # action -> seconds per serve() call
+        self.lags = []
+
+    def interactive(self) -> list:
+        """Latencies of every action except the debounced ones."""
+        return [latency for action, values in self.latencies.items() if action not in DEBOUNCED_ACTIONS
+                for latency in values]
+
+
+async def lag_monitor(recorder: Recorder, interval: float = 0.01):
+    """Record how late the event loop wakes up from a short sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        recorder.lags.append(max(0.0, loop.time() - started - interval))
+
+
+async def run_session(serve, session_no: int, actions: int, think: float, rng: random.Random, recorder: Recorder):
+    """Play one browser session; returns its page and client so they stay connected until the level ends."""
+    from h2o_wave.core import Expando
+    page, client = FakePage(f'/client-{session_no}'), Expando()
+    state = {'search': '', 'unit_f': False, 'light': False}
+
+    async def event(action, args, source=None):
+        # Wave names the component that submitted the event, next to the values of all inputs
+        args = dict(args, __wave_submission_name__=source)
+        started = time.perf_counter()
+        await serve(FakeQ(page, client, args))
+        recorder.latencies[action].append(time.perf_counter() - started)
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+    await event('load', {})
+    names, weights = zip(*ACTION_MIX)
+    for _ in range(actions):
+        action = rng.choices(names, weights)[0]
+        if action == 'search':
+            city = rng.choice(CITIES)
+            await event('suggest', {'search': city[:3]}, 'search')  # search-as-you-type
+            state['search'] = city
+            await event('search', {'search': city, 'search_button': True}, 'search_button')
+        elif action == 'toggle_unit':
+            state['unit_f'] = not state['unit_f']
+            await event(action, {'search': state['search'], 'toggle_unit': state['unit_f']}, 'toggle_unit')
+        elif action == 'toggle_theme':
+            state['light'] = not state['light']
+            await event(action, {'search': state['search'], 'toggle_theme': state['light']}, 'toggle_theme')
+        else:
+            state['search'] = ''
+            await event(action, {'clear_button': True}, 'clear_button')
+    return page, client
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def run_level(concurrency: int, args, stub: OpenMeteoStub, seed: int) -> dict:
+    import main
+    from app import api
+    from app.session import sessions
+
+    api.clear_caches()
+    sessions.clear()
+    rng = random.Random(seed)
+    recorder = Recorder()
+    total_sessions = max(concurrency, args.min_sessions)
+    gate = asyncio.Semaphore(concurrency)
+    upstream_before = stub.requests
+
+    async def gated(session_no):
+        async with gate:
+            return await run_session(main.serve, session_no, args.actions, args.think_ms / 1000, rng, recorder)
+
+    monitor = asyncio.create_task(lag_monitor(recorder))
+    started = time.perf_counter()
+    connected = await asyncio.gather(*(gated(n) for n in range(total_sessions)))
+    elapsed = time.perf_counter() - started
+    monitor.cancel()
+
+    live = len(sessions)
+    interactive = recorder.interactive()
+    suggest = [latency for action in DEBOUNCED_ACTIONS for latency in recorder.latencies[action]]
+    return {
+        'concurrency': concurrency,
+        'sessions_per_sec': total_sessions / elapsed,
+        'events_per_sec': len(interactive) / elapsed,
+        'p50_ms': percentile(interactive, 50) * 1000,
+        'p95_ms': percentile(interactive, 95) * 1000,
+        'p99_ms': percentile(interactive, 99) * 1000,
+        'suggest_p95_ms': percentile(suggest, 95) * 1000,
+        'action_p95_ms': {action: percentile(values, 95) * 1000 for action, values in recorder.latencies.items()},
+        'lag_p99_ms': percentile(recorder.lags, 99) * 1000,
+        'lag_max_ms': max(recorder.lags, default=0) * 1000,
+        'session_bytes': sessions.memory_bytes() / live if live else 0,
+        'upstream': stub.requests - upstream_before,
+        'connected': len(connected),
+    }
+
+
+async def measure_memory_per_session(count: int) -> float:
+    """Python heap growth per freshly initialised session, measured with tracemalloc."""
+    import main
+    from h2o_wave.core import Expando
+    from app.session import sessions
+
+    sessions.clear()
+    keep = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(count):
+        page, client = FakePage(f'/mem-{n}'), Expando()
+        await main.serve(FakeQ(page, client, {}))
+        page._changed.clear()
+        keep.append((page, client))
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    sessions.clear()
+    return grown / count
+
+
+async def run(args) -> list:
+    stub = OpenMeteoStub(latency=args.upstream_latency_ms / 1000).start()
+    os.environ['OPEN_METEO_BASE_URL'] = stub.base_url
+    os.environ['OPEN_METEO_GEOCODING_URL'] = f"{stub.base_url}/search"
+    os.environ['OPEN_METEO_ARCHIVE_URL'] = f"{stub.base_url}/archive"
+    os.environ['OPEN_METEO_AIR_QUALITY_URL'] = f"{stub.base_url}/air-quality"
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.executor_workers))
+    results = []
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            import main  # noqa: F401 - imported after the stand-in URLs are set
+            memory = await measure_memory_per_session(args.memory_sessions)
+            for i, level in enumerate(args.levels):
+                results.append(await run_level(level, args, stub, seed=args.seed + i))
+    finally:
+        stub.stop()
+    return results, memory
+
+
+def report(results: list, memory: float) -> None:
+    print("evt/s and p50/p95/p99 cover interactive events; suggest p95 includes the debounce")
+    header = f"{'conc':>6} {'sess/s':>8} {'evt/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sugg p95':>9} " \
+             f"{'lag p99':>8} {'lag max':>8} {'B/sess':>8} {'upstream':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['concurrency']:>6} {r['sessions_per_sec']:>8.1f} {r['events_per_sec']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['suggest_p95_ms']:>9.1f} "
+              f"{r['lag_p99_ms']:>8.1f} {r['lag_max_ms']:>8.1f} {r['session_bytes']:>8.0f} {r['upstream']:>9}")
+
+    actions = sorted({action for r in results for action in r['action_p95_ms']})
+    print(f"\np95 ms by action\n{'conc':>6} " + ' '.join(f"{action:>12}" for action in actions))
+    for r in results:
+        print(f"{r['concurrency']:>6} " + ' '.join(f"{r['action_p95_ms'].get(action, 0):>12.1f}" for action in actions))
+    print(f"\nHeap per fresh session (tracemalloc): {memory:.0f} bytes")
+    knee = max(results, key=lambda r: r['events_per_sec'] / max(r['p95_ms'], 1e-6))
+    print(f"Knee of the latency curve: ~{knee['concurrency']} concurrent sessions "
+          f"({knee['events_per_sec']:.0f} events/s at p95 {knee['p95_ms']:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,4,16,64,256,1024',
+                        type=lambda value: [int(level) for level in value.split(',')],
+                        help='comma-separated concurrent session counts')
+    parser.add_argument('--actions', type=int, default=6, help='interactions per session after page load')
+    parser.add_argument('--min-sessions', type=int, default=50, help='sessions run per level, at least')
+    parser.add_argument('--think-ms', type=float, default=0, help='mean think time between events')
+    parser.add_argument('--upstream-latency-ms', type=float, default=30)
+    parser.add_argument('--executor-workers', type=int, default=32, help='threads for upstream HTTP calls')
+    parser.add_argument('--memory-sessions', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    results, memory = asyncio.run(run(args))
+    report(results, memory)
+
+
+if __name__ == '__main__':
+    main()
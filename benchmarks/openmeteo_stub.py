@@ -0,0 +1,174 @@
+"""
+Local stand-in for the Open-Meteo forecast, air-quality, archive and geocoding APIs.
+
+Serves the recorded payloads in tests/fixtures with an artificial upstream
+latency, so load tests never touch the real service:
+
+    python -m benchmarks.openmeteo_stub --port 8089 --latency-ms 30
+
+Point the app at it with:
+
+    OPEN_METEO_BASE_URL=http://127.0.0.1:8089/v1
+    OPEN_METEO_GEOCODING_URL=http://127.0.0.1:8089/v1/search
+    OPEN_METEO_ARCHIVE_URL=http://127.0.0.1:8089/v1/archive
+    OPEN_METEO_AIR_QUALITY_URL=http://127.0.0.1:8089/v1/air-quality
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+
+
+def _load(name: str) -> dict:
+    return json.loads((FIXTURES / name).read_text(encoding='utf-8'))
+
+
+def _fake_coordinates(name: str):
+    """Stable pseudo-random coordinates for any place name."""
+    digest = hashlib.blake2b(name.casefold().encode('utf-8'), digest_size=4).digest()
+    return round(digest[0] / 255 * 120 - 60, 4), round(int.from_bytes(digest[1:3], 'little') / 65535 * 360 - 180, 4)
+
+
+# wind_speed_unit parameter: (unit label in responses, metres per second in one unit)
+WIND_UNITS = {'kmh': ('km/h', 1 / 3.6), 'ms': ('m/s', 1.0)}
+
+
+def _scale(value, factor):
+    if isinstance(value, list):
+        return [_scale(item, factor) for item in value]
+    return None if value is None else round(value * factor, 2)
+
+
+def in_wind_unit(body: dict, unit: str) -> dict:
+    """Convert the fixtures' wind speeds, recorded in km/h or m/s, to the requested unit as Open-Meteo does."""
+    if unit not in WIND_UNITS:
+        return body
+    label, size = WIND_UNITS[unit]
+    sizes = dict(WIND_UNITS.values())
+    body = dict(body)
+    for section in ('current', 'daily'):
+        units = body.get(f'{section}_units')
+        if section not in body or not units:
+            continue
+        values, units = dict(body[section]), dict(units)
+        for field, unit_name in units.items():
+            if unit_name in sizes and unit_name != label:
+                values[field] = _scale(values[field], sizes[unit_name] / size)
+                units[field] = label
+        body[section], body[f'{section}_units'] = values, units
+    return body
+
+
+class OpenMeteoStub:
+    """Threaded HTTP server answering forecast, air-quality, archive and geocoding requests from fixtures."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.03):
+        self.latency = latency
+        self.requests = 0
+        self._current = _load('current_london.json')
+        self._forecast = _load('forecast_london.json')
+        self._geocoding = _load('geocoding_london.json')
+        self._archive = _load('archive_london.json')
+        self._air_quality = _load('air_quality_london.json')
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub._count()
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                body = stub.respond(url.path, params)
+                time.sleep(stub.latency)
+                status = 200 if body is not None else 404
+                payload = json.dumps(body if body is not None else {'error': True, 'reason': 'Not found'}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024  # The default backlog of 5 drops connections under load
+
+        self.server = Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def respond(self, path: str, params: dict):
+        """Build the JSON body for a request path, or None for unknown paths."""
+        if path == '/v1/search':
+            name = params.get('name', '')
+            lat, lon = _fake_coordinates(name)
+            result = dict(self._geocoding['results'][0], name=name.title(), latitude=lat, longitude=lon)
+            return {'results': [result], 'generationtime_ms': 0.5}
+        if path == '/v1/forecast':
+            template = self._current if 'current' in params else self._forecast
+            body = dict(template, latitude=float(params.get('latitude', 0)), longitude=float(params.get('longitude', 0)))
+            return in_wind_unit(body, params.get('wind_speed_unit', 'kmh'))
+        if path == '/v1/air-quality':
+            return dict(self._air_quality, latitude=float(params.get('latitude', 0)),
+                        longitude=float(params.get('longitude', 0)))
+        if path == '/v1/archive':
+            return self._archive_range(params)
+        return None
+
+    def _archive_range(self, params: dict) -> dict:
+        """Archive days for the requested dates, cycling through the recorded values."""
+        start, end = date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date'])
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        recorded = self._archive['daily']
+        daily = {'time': [day.isoformat() for day in days]}
+        for field, values in recorded.items():
+            if field != 'time':
+                daily[field] = [values[day.toordinal() % len(values)] for day in days]
+        return dict(self._archive, daily=daily, latitude=float(params.get('latitude', 0)),
+                    longitude=float(params.get('longitude', 0)))
+
+    def start(self) -> 'OpenMeteoStub':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    args = parser.parse_args()
+    stub = OpenMeteoStub(args.host, args.port, args.latency_ms / 1000)
+    print(f"Open-Meteo stand-in listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,79 @@
-from h2o_wave import Q, app, main, ui, data
-from app.api import get_weather_data, get_forecast_data
-from app.utils import convert_temperature
-
+import asyncio
+import os
+import signal
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
 
-@app('/')
+from h2o_wave import Q, app, main, ui, data
+from app.api import (get_weather_data, get_forecast_data, get_air_quality_data, get_history_data, latest_archived_day, search_locations,
+                     suggest_cities, fetch_city_suggestions, seed_city_index)
+from app.alerts import RULE_METRICS, alerts, location_key
+from app.autocomplete import location_label
+from app.session import sessions
+from app.profiler import PROFILE_SECONDS, profiler
+from app.watchdog import WATCHDOG_ENABLED, watchdog
+from app.utils import convert_temperature, normalize_city_name
+
+# Wait this long after a keystroke before asking the geocoding API for suggestions
+SUGGEST_DEBOUNCE_SECONDS = 0.4
+# The geocoding API only matches fuzzily from three characters on
+SUGGEST_MIN_REMOTE_CHARS = 3
+
+# The #admin page (profiler, gauges) is only served when explicitly enabled
+ADMIN_ENABLED = os.environ.get('WEATHER_ADMIN') == '1'
+ADMIN_PROFILE_SECONDS = float(os.environ.get('WEATHER_ADMIN_PROFILE_SECONDS', 30))
+
+# Past-weather periods offered under the current weather
+HISTORY_PERIODS = {'last_30_days': 'Last 30 days', 'last_year': 'This week last year'}
+
+
+# Tasks started with the app and cancelled on shutdown
+background_tasks = []
+
+# Alert rules outlive idle sessions and go away with the client
+sessions.on_disconnect(alerts.discard_owner)
+
+
+async def on_startup():
+    # Suggest places other workers already geocoded into a shared cache
+    background_tasks.append(asyncio.create_task(seed_city_index()))
+    # Compact idle sessions and enforce the session memory budget
+    background_tasks.append(asyncio.create_task(sessions.run_sweeper()))
+    # Re-check alert rules of places whose forecast changed
+    background_tasks.append(asyncio.create_task(alerts.run_refresher()))
+    # Report callbacks that block the event loop
+    if WATCHDOG_ENABLED:
+        background_tasks.append(watchdog.start())
+    # Profile the first minutes after startup, and on SIGUSR1 at any time
+    if PROFILE_SECONDS:
+        profiler.start(PROFILE_SECONDS)
+    if hasattr(signal, 'SIGUSR1'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, profiler.start, ADMIN_PROFILE_SECONDS)
+
+
+async def on_shutdown():
+    watchdog.stop()
+    profiler.stop()
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    sessions.clear()
+    alerts.clear()
+
+
+@app('/', on_startup=on_startup, on_shutdown=on_shutdown)
 async def serve(q: Q):
     print("Serve function started.")
 
+    # Per-client state lives in a compact slotted object owned by the session store
+    q.client = sessions.attach(q)
+
+    # Admin page: #admin shows diagnostics, #admin/profile opens a profiling window
+    if ADMIN_ENABLED and (q.args.admin_profile or (q.args['#'] or '').startswith('admin')):
+        await handle_admin(q)
+        return
+
     # Clear button
     if q.args.clear_button:
         print("Clear button pressed.")
@@ -35,6 +102,27 @@ async def serve(q: Q):
     elif q.args.toggle_theme:
         print("Theme toggle pressed.")
         await handle_toggle_theme(q)
+    elif q.args.pick_city:
+        print(f"Suggestion picked: {q.args.pick_city}")
+        await handle_pick(q, q.client.suggestions, q.args.pick_city)
+    elif q.args.pick_location:
+        print(f"Location picked: {q.args.pick_location}")
+        await handle_pick(q, q.client.location_candidates, q.args.pick_location)
+    elif q.args.history:
+        print(f"History requested: {q.args.history}")
+        await handle_history(q)
+    elif q.args.watch:
+        print("Watch pressed.")
+        await handle_watch(q)
+    elif q.args.add_alert:
+        print("Add alert pressed.")
+        await handle_add_alert(q)
+    elif q.args.remove_alert:
+        print(f"Remove alert: {q.args.remove_alert}")
+        await handle_remove_alert(q)
+    elif q.args['__wave_submission_name__'] == 'search':
+        # Every event carries the search box's text; only its own keystrokes ask for suggestions
+        await handle_suggest(q)
     else:
         search_view(q)
         await q.page.save()
@@ -79,15 +167,12 @@ async def handle_toggle_theme(q: Q):
     await q.page.save()
 
 
-# Main layout and header/footer
-def main_app(q: Q):
-    # Initialize theme if not exists
-    if not hasattr(q.client, 'theme') or q.client.theme is None:
-        q.client.theme = 'h2o-dark'
-        
-    q.page['layout'] = ui.meta_card(
+# Layout, header and footer never change per client: build each card once and reuse it
+@lru_cache(maxsize=None)
+def layout_card(theme: str):
+    return ui.meta_card(
         box='meta',
-        theme=q.client.theme,  # Use dynamic theme
+        theme=theme,
         layouts=[
             ui.layout(
                 breakpoint='xl',
@@ -132,19 +217,36 @@ def main_app(q: Q):
         ]
     )
 
-    q.page['header'] = ui.header_card(
+
+@lru_cache(maxsize=None)
+def header_card():
+    return ui.header_card(
         box='header',
         title='🌤️ Weather Dashboard',
         subtitle='Get real-time weather information',
         icon='CloudWeather'
     )
 
-    q.page['footer'] = ui.footer_card(
+
+@lru_cache(maxsize=None)
+def footer_card():
+    return ui.footer_card(
         box='footer',
         caption='Mamta Nallaretnam ©2025'
     )
 
 
+# Main layout and header/footer
+def main_app(q: Q):
+    # Initialize theme if not exists
+    if not hasattr(q.client, 'theme') or q.client.theme is None:
+        q.client.theme = 'h2o-dark'
+
+    q.page['layout'] = layout_card(q.client.theme)  # Use dynamic theme
+    q.page['header'] = header_card()
+    q.page['footer'] = footer_card()
+
+
 # Search box and controls
 def search_view(q: Q):
     # Initialize theme if not exists
@@ -160,7 +262,8 @@ def search_view(q: Q):
                 label='Enter city name', 
                 placeholder='e.g., London, Dubai, New York', 
                 required=True,
-                value=q.args.search if hasattr(q.args, 'search') else ''
+                value=q.args.search if hasattr(q.args, 'search') else '',
+                trigger=True  # Submit while typing to drive suggestions
             ),
             ui.buttons(items=[
                 ui.button(name='search_button', label='Search', primary=True, icon='Search'),
@@ -182,6 +285,65 @@ def search_view(q: Q):
         ]
     )
 
+# City suggestions under the search box
+def suggestions_view(q: Q, suggestions):
+    if not suggestions:
+        try:
+            del q.page['suggestions']
+        except KeyError:
+            pass
+        return
+
+    q.page['suggestions'] = ui.form_card(
+        box='sidebar',
+        title='💡 Suggestions',
+        items=[
+            ui.button(name='pick_city', label=location_label(location), value=str(i), link=True)
+            for i, location in enumerate(suggestions)
+        ]
+    )
+
+
+# Search-as-you-type: local prefix index first, debounced geocoding only on a miss
+async def handle_suggest(q: Q):
+    prefix = q.args.search.strip()
+    q.client.suggest_seq = (q.client.suggest_seq or 0) + 1
+    seq = q.client.suggest_seq
+
+    suggestions = suggest_cities(prefix)
+    if not suggestions and len(prefix) >= SUGGEST_MIN_REMOTE_CHARS:
+        await asyncio.sleep(SUGGEST_DEBOUNCE_SECONDS)
+        if q.client.suggest_seq != seq:
+            return  # A newer keystroke superseded this one
+        suggestions = await fetch_city_suggestions(prefix)
+        if q.client.suggest_seq != seq:
+            return
+
+    q.client.suggestions = suggestions
+    suggestions_view(q, suggestions)
+    await q.page.save()
+
+
+# Alternatives for ambiguous city names, e.g. Paris, France vs Paris, Texas
+def location_choice_view(q: Q, candidates, selected):
+    if not candidates or len(candidates) < 2:
+        try:
+            del q.page['locations']
+        except KeyError:
+            pass
+        return
+
+    q.page['locations'] = ui.form_card(
+        box='sidebar',
+        title='📍 Did you mean?',
+        items=[ui.text(f"Showing **{location_label(selected)}**")] + [
+            ui.button(name='pick_location', label=location_label(location), value=str(i), link=True)
+            for i, location in enumerate(candidates)
+            if location is not selected
+        ]
+    )
+
+
 # Map weather condition codes to icons
 def weather_icon(condition_code: int) -> str:
     # OpenWeatherMap icon codes prefix mapping
@@ -247,10 +409,68 @@ def weather_view(q: Q, weather_data):
             ui.text(f"**📊 Pressure:** {weather_data['main']['pressure']} hPa"),
             ui.separator(),
             ui.text(f"**📝 Description:** {weather_data['weather'][0]['description'].title()}"),
+            ui.buttons(items=[
+                ui.button(name='history', label=label, value=period, icon='History')
+                for period, label in HISTORY_PERIODS.items()
+            ] + [ui.button(name='watch', label='Watch', icon='FavoriteStar')]),
         ]
     )
 
 
+# European AQI bands (EEA)
+def aqi_level(european_aqi) -> str:
+    if european_aqi is None:
+        return 'Unknown'
+    if european_aqi <= 20:
+        return '🟢 Good'
+    elif european_aqi <= 40:
+        return '🟢 Fair'
+    elif european_aqi <= 60:
+        return '🟡 Moderate'
+    elif european_aqi <= 80:
+        return '🟠 Poor'
+    elif european_aqi <= 100:
+        return '🔴 Very poor'
+    else:
+        return '🟣 Extremely poor'
+
+# WHO UV index categories
+def uv_level(uv_index) -> str:
+    if uv_index is None:
+        return 'Unknown'
+    if uv_index < 3:
+        return 'Low'
+    elif uv_index < 6:
+        return 'Moderate'
+    elif uv_index < 8:
+        return 'High'
+    elif uv_index < 11:
+        return 'Very high'
+    else:
+        return 'Extreme'
+
+
+# Air quality, UV and pollen card
+def air_quality_view(q: Q, air_quality_data):
+    def reading(value, unit=''):
+        return 'n/a' if value is None else f"{value:g}{unit}"
+
+    items = [
+        ui.text(f"**European AQI:** {reading(air_quality_data['european_aqi'])} "
+                f"({aqi_level(air_quality_data['european_aqi'])})", size='l'),
+        ui.text(f"**US AQI:** {reading(air_quality_data['us_aqi'])}"),
+        ui.text(f"**PM2.5:** {reading(air_quality_data['pm2_5'], ' μg/m³')} · "
+                f"**PM10:** {reading(air_quality_data['pm10'], ' μg/m³')}"),
+        ui.separator(),
+        ui.text(f"**☀️ UV index:** {reading(air_quality_data['uv_index'])} ({uv_level(air_quality_data['uv_index'])})"),
+    ]
+    if air_quality_data['pollen']:
+        pollen = ', '.join(f"{name} {count:g}" for name, count in air_quality_data['pollen'].items())
+        items.append(ui.text(f"**🌼 Pollen (grains/m³):** {pollen}"))
+
+    q.page['air_quality'] = ui.form_card(box='content', title='🌬️ Air Quality & UV', items=items)
+
+
 # Forecast table
 def forecast_view(q: Q, forecast_data):
     daily = {}
@@ -463,8 +683,18 @@ def error_view(q: Q):
     )
 
 
+# Keep the place the user picked when they search the same name again (e.g. after a unit toggle)
+def chosen_location(q: Q, city, candidates):
+    previous = q.client.location
+    if isinstance(previous, dict) and normalize_city_name(previous['name']) == normalize_city_name(city):
+        for location in candidates:
+            if (location['latitude'], location['longitude']) == (previous['latitude'], previous['longitude']):
+                return location
+    return candidates[0]
+
+
 # Search button logic
-async def handle_search(q: Q):
+async def handle_search(q: Q, location=None):
     city = q.args.search
     if not city:
         print("No city entered. Clearing.")
@@ -473,21 +703,43 @@ async def handle_search(q: Q):
 
     print(f"Searching for city: {city}")
 
-    for card in ['weather', 'forecast', 'forecast_chart', 'error']:
+    for card in ['weather', 'forecast', 'forecast_chart', 'error', 'suggestions', 'locations', 'history', 'air_quality']:
         try:
             del q.page[card]
         except KeyError:
             pass
 
-    weather_data = await get_weather_data(city)
-    forecast_data = await get_forecast_data(city)
+    # Geocode once; the chosen coordinates feed both fetches
+    if location is None:
+        candidates = await search_locations(city)
+        location = chosen_location(q, city, candidates) if candidates else None
+        q.client.location_candidates = candidates
+    else:
+        candidates = q.client.location_candidates
+
+    weather_data = forecast_data = air_quality_data = None
+    if location is not None:
+        q.client.location = location
+        weather_data, forecast_data, air_quality_data = await asyncio.gather(
+            get_weather_data(city, location),
+            get_forecast_data(city, location),
+            get_air_quality_data(city, location),
+        )
+
+    if forecast_data:
+        alerts.on_forecast(location, forecast_data)  # No-op unless someone watches this place
 
     if weather_data:
         weather_view(q, weather_data)
+        if q.client.favorite_locations:
+            alerts_view(q)
+        if air_quality_data:
+            air_quality_view(q, air_quality_data)
         if forecast_data and forecast_data.get('list'):
             forecast_view(q, forecast_data)
             print("calling forecast chart view...")
             forecast_chart_view(q, forecast_data)
+        location_choice_view(q, candidates, location)
     else:
         error_view(q)
 
@@ -496,6 +748,180 @@ async def handle_search(q: Q):
     await q.page.save()
 
 
+# Suggestion or "did you mean" pick: reuse the stored coordinates, no geocoding
+async def handle_pick(q: Q, locations, value):
+    try:
+        location = locations[int(value)]
+    except (TypeError, ValueError, IndexError):
+        search_view(q)
+        await q.page.save()
+        return
+
+    if locations is not q.client.location_candidates:
+        q.client.location_candidates = [location]
+    q.args.search = location['name']
+    await handle_search(q, location)
+
+
+# Date range of a history period; the archive only reaches a few days back from today
+def history_range(period: str, today: Optional[date] = None) -> Tuple[date, date]:
+    today = today or date.today()
+    if period == 'last_year':
+        try:
+            same_day = today.replace(year=today.year - 1)
+        except ValueError:
+            same_day = today.replace(year=today.year - 1, day=28)  # 29 February
+        return same_day - timedelta(days=3), same_day + timedelta(days=3)
+    end = latest_archived_day(today)
+    return end - timedelta(days=29), end
+
+
+# Past weather table
+def history_view(q: Q, history, label):
+    unit = q.client.temperature_unit
+    if not history['days']:
+        items = [ui.text('No archived weather for this period yet.')]
+    else:
+        rows = []
+        for i, day in enumerate(history['days']):
+            high = convert_temperature(day['temp_max'], unit)
+            low = convert_temperature(day['temp_min'], unit)
+            rows.append(ui.table_row(name=f'day_{i}', cells=[
+                day['date'],
+                f"{high:.1f}°{unit}",
+                f"{low:.1f}°{unit}",
+                f"{day['precipitation']:.1f} mm",
+                f"{get_weather_emoji(day['weather']['id'])} {day['weather']['description'].title()}",
+            ]))
+        items = [ui.table(
+            name='history_table',
+            columns=[
+                ui.table_column(name='date', label='Date', min_width='120px'),
+                ui.table_column(name='high', label='High', min_width='100px'),
+                ui.table_column(name='low', label='Low', min_width='100px'),
+                ui.table_column(name='precipitation', label='Precipitation', min_width='120px'),
+                ui.table_column(name='desc', label='Description', min_width='200px'),
+            ],
+            rows=rows,
+        )]
+    q.page['history'] = ui.form_card(
+        box='content',
+        title=f"🕰️ {label} in {history['name']} ({history['start']} – {history['end']})",
+        items=items,
+    )
+
+
+# History button: archived days come from the local store, only gaps are fetched
+async def handle_history(q: Q):
+    period = q.args.history if q.args.history in HISTORY_PERIODS else 'last_30_days'
+    location = q.client.location if isinstance(q.client.location, dict) else None
+    city = location['name'] if location else q.args.search
+    if not city:
+        search_view(q)
+        await q.page.save()
+        return
+
+    start, end = history_range(period)
+    history = await get_history_data(city, start, end, location)
+    if history is None:
+        q.page['history'] = ui.form_card(box='content', title='🕰️ History', items=[
+            ui.text('Past weather is not available for this place right now.'),
+        ])
+    else:
+        history_view(q, history, HISTORY_PERIODS[period])
+    await q.page.save()
+
+
+# Alert thresholds are entered in display units and stored in forecast units (%, m/s, °C)
+def alert_threshold_label(q: Q, metric: str, threshold: float) -> str:
+    label, _, above = RULE_METRICS[metric]
+    sign = '≥' if above else '≤'
+    if metric == 'precipitation':
+        return f"{label} {sign} {threshold:.0f}%"
+    if metric == 'wind':
+        return f"{label} {sign} {threshold * 3.6:.0f} km/h"
+    return f"{label} {sign} {convert_temperature(threshold, q.client.temperature_unit):.1f}°{q.client.temperature_unit}"
+
+
+def parse_alert_threshold(q: Q, metric: str, text) -> float:
+    value = float(str(text).strip())
+    if metric == 'wind':
+        return value / 3.6  # km/h to m/s
+    if metric in ('heat', 'frost') and q.client.temperature_unit == 'F':
+        return (value - 32) * 5 / 9
+    return value
+
+
+# Favorites, their alert rules and any alerts that are firing
+def alerts_view(q: Q, error: Optional[str] = None):
+    owner = q.page.url
+    items = []
+    for rule, hit in alerts.alerts_for(owner):
+        items.append(ui.message_bar(
+            type='warning',
+            text=f"**{location_label(rule.location)}** on {hit['date']}: {alert_threshold_label(q, rule.metric, rule.threshold)}"
+        ))
+    if error:
+        items.append(ui.message_bar(type='error', text=error))
+    for rule in alerts.rules_for(owner):
+        items.append(ui.button(name='remove_alert', value=str(rule.id), link=True,
+                               label=f"✖ {rule.location['name']}: {alert_threshold_label(q, rule.metric, rule.threshold)}"))
+
+    unit = q.client.temperature_unit
+    units = {'precipitation': '%', 'wind': 'km/h', 'heat': f'°{unit}', 'frost': f'°{unit}'}
+    items += [
+        ui.separator(),
+        ui.dropdown(name='alert_city', label='Place', value='0', choices=[
+            ui.choice(name=str(i), label=location_label(location))
+            for i, location in enumerate(q.client.favorite_locations)
+        ]),
+        ui.dropdown(name='alert_metric', label='When', value='precipitation', choices=[
+            ui.choice(name=metric, label=f"{label} {'≥' if above else '≤'} ({units[metric]})")
+            for metric, (label, _, above) in RULE_METRICS.items()
+        ]),
+        ui.textbox(name='alert_threshold', label='Threshold', value='60'),
+        ui.button(name='add_alert', label='Add alert', icon='Ringer'),
+    ]
+    q.page['alerts'] = ui.form_card(box='sidebar', title='🔔 Favorites & Alerts', items=items)
+
+
+# Watch button: remember the shown place as a favorite
+async def handle_watch(q: Q):
+    location = q.client.location
+    if isinstance(location, dict):
+        favorites = q.client.favorite_locations
+        if all(location_key(favorite) != location_key(location) for favorite in favorites):
+            favorites.append(location)
+    alerts_view(q)
+    await q.page.save()
+
+
+# New alert rule on a favorite; checked at once against the (usually cached) forecast
+async def handle_add_alert(q: Q):
+    favorites = q.client.favorite_locations
+    metric = q.args.alert_metric if q.args.alert_metric in RULE_METRICS else 'precipitation'
+    try:
+        location = favorites[int(q.args.alert_city or 0)]
+        threshold = parse_alert_threshold(q, metric, q.args.alert_threshold)
+    except (TypeError, ValueError, IndexError):
+        alerts_view(q, error='Pick a watched place and enter a number.')
+        await q.page.save()
+        return
+
+    alerts.add(q.page.url, location, metric, threshold)
+    alerts.on_forecast(location, await get_forecast_data(location['name'], location))
+    alerts_view(q)
+    await q.page.save()
+
+
+async def handle_remove_alert(q: Q):
+    for rule in alerts.rules_for(q.page.url):
+        if str(rule.id) == q.args.remove_alert:
+            alerts.remove(rule.id)  # Only the client's own rules
+    alerts_view(q)
+    await q.page.save()
+
+
 # Toggle °C/°F logic
 async def handle_toggle_unit(q: Q):
     print(f"Toggling temperature unit. Current: {q.client.temperature_unit}")
@@ -529,7 +955,7 @@ async def handle_toggle_unit(q: Q):
 
 async def handle_clear(q: Q):
     print("Clearing all cards.")
-    for card in ['weather', 'forecast','forecast_chart', 'error', 'search']:
+    for card in ['weather', 'forecast','forecast_chart', 'error', 'search', 'suggestions', 'locations', 'history', 'air_quality']:
         try:
             del q.page[card]
         except KeyError:
@@ -537,4 +963,31 @@ async def handle_clear(q: Q):
     # Reset search box
     q.args.search = ''
     search_view(q)
-    await q.page.save()
\ No newline at end of file
+    await q.page.save()
+
+
+# Diagnostics for operators: profiler window, loop lag and session gauges
+async def handle_admin(q: Q):
+    if not q.client.initialized:
+        main_app(q)  # Opened straight on #admin: the layout zones are needed for the card
+
+    if q.args['#'] == 'admin/profile' or q.args.admin_profile:
+        started = profiler.start(ADMIN_PROFILE_SECONDS)
+        print(f"Admin profiling request: {'started' if started else 'already running'}")
+
+    lag = watchdog.stats()
+    items = [
+        ui.text(f"**Profiler:** {'running' if profiler.running else 'idle'}"
+                f" (window {ADMIN_PROFILE_SECONDS:.0f}s)"),
+        ui.text(f"**Last profile:** {profiler.last_output or 'none yet'}"),
+    ]
+    for name, count in profiler.summary().items():
+        items.append(ui.text(f"`{name}`: {count} samples"))
+    items += [
+        ui.separator(),
+        ui.text(f"**Live sessions:** {len(sessions)} ({sessions.memory_bytes()} bytes)"),
+        ui.text(f"**Loop lag:** {lag['lag_ms']} ms (max {lag['max_lag_ms']} ms, {lag['stalls']} stalls)"),
+        ui.button(name='admin_profile', label='Profile now', icon='Stopwatch'),
+    ]
+    q.page['admin'] = ui.form_card(box='content', title='🛠️ Admin', items=items)
+    await q.page.save()
@@ -0,0 +1,28 @@
+"""
+Helpers shared by the test modules.
+"""
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def fixture_response(name):
+    # Mimic a requests.Response carrying a recorded payload
+    response = MagicMock()
+    response.content = (FIXTURES / name).read_bytes()
+    return response
+
+
+# Mock the Q object for testing
+class MockQ:
+    def __init__(self):
+        # Use MagicMock for page to track assignments
+        self.page = MagicMock()
+        self.args = MagicMock()
+        self.client = MagicMock()
+        self.events = MagicMock()
+        self.page.save = AsyncMock()
+
+    async def page_save(self):
+        await self.page.save()
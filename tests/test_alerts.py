@@ -0,0 +1,73 @@
+import copy
+
+import pytest
+
+from app.alerts import AlertEngine, location_key
+
+LONDON = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+PARIS = {'name': 'Paris', 'latitude': 48.85341, 'longitude': 2.3488}
+
+
+def forecast(pops, wind=5.0, low=8.0, high=20.0):
+    return {'list': [
+        {'dt_txt': f'2025-06-{14 + i} 12:00:00', 'pop': pop, 'wind': {'speed': wind},
+         'main': {'temp': (low + high) / 2, 'temp_min': low, 'temp_max': high}}
+        for i, pop in enumerate(pops)
+    ]}
+
+
+def test_rules_fire_on_first_crossing_day():
+    engine = AlertEngine()
+    rain = engine.add('/a', LONDON, 'precipitation', 60)
+    frost = engine.add('/a', LONDON, 'frost', 0)
+    assert engine.on_forecast(LONDON, forecast([0.1, 0.05, 0.78])) == [rain]
+    assert engine.alerts_for('/a') == [(rain, {'date': '2025-06-16', 'value': pytest.approx(78)})]
+    assert engine.on_forecast(LONDON, forecast([0.1], low=-2.0)) == [frost]
+    assert [rule for rule, _ in engine.alerts_for('/a')] == [frost]  # Rain no longer forecast
+
+def test_unchanged_forecast_is_not_rechecked():
+    engine = AlertEngine()
+    for owner in range(1000):
+        engine.add(f'/{owner}', LONDON, 'precipitation', 50)
+    engine.add('/paris', PARIS, 'wind', 10)
+    london = forecast([0.2, 0.3])
+    engine.on_forecast(LONDON, london)
+    assert engine.evaluations == 1000
+    engine.on_forecast(LONDON, copy.deepcopy(london))  # Same forecast fetched again
+    engine.on_forecast(PARIS, forecast([0.0], wind=12.0))
+    assert engine.evaluations == 1001  # Only the changed place's rules ran
+
+def test_new_rule_is_checked_against_known_forecast():
+    engine = AlertEngine()
+    engine.add('/a', LONDON, 'heat', 30)
+    engine.on_forecast(LONDON, forecast([0.0]))
+    late = engine.add('/b', LONDON, 'heat', 15)
+    assert engine.on_forecast(LONDON, forecast([0.0])) == [late]
+
+def test_remove_and_discard_owner_clean_indexes():
+    engine = AlertEngine()
+    kept = engine.add('/live', LONDON, 'wind', 10)
+    gone = engine.add('/closed', PARIS, 'wind', 10)
+    assert engine.discard_owner('/closed') == 1
+    assert engine.discard_owner('/never-seen') == 0
+    assert engine.rules_for('/closed') == []
+    assert list(engine.watched()) == [location_key(LONDON)]
+    engine.remove(kept.id)
+    engine.remove(gone.id)  # Already gone: no error
+    assert len(engine) == 0 and engine.watched() == {}
+
+@pytest.mark.asyncio
+async def test_refresh_fetches_each_watched_place_once():
+    engine = AlertEngine()
+    for owner in ('/a', '/b', '/c'):
+        engine.add(owner, LONDON, 'precipitation', 50)
+    fetched = []
+
+    async def fetch(city, location):
+        fetched.append(city)
+        return forecast([0.9])
+
+    started = await engine.refresh(fetch)
+    assert fetched == ['London'] and len(started) == 3
+    assert await engine.refresh(fetch) == []
+    assert engine.evaluations == 3
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import math
+import subprocess
+import sys
+import time
+from array import array
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.api import (FORECAST_DAILY_FIELDS, HISTORY_DAILY_FIELDS, clear_caches, fetch_city_suggestions,
+                     get_air_quality_data, get_city_index, get_coordinates, get_forecast_data, get_history_data,
+                     get_weather_data, search_locations, suggest_cities)
+from app.decoding import decode_daily, is_missing, loads, project
+from app.timeseries import LOCK_FILE, TimeSeriesStore, fcntl
+from tests.conftest import FIXTURES, fixture_response
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+@pytest.fixture
+def remote_only(monkeypatch):
+    # Force the geocoding API path even for cities in the bundled gazetteer
+    monkeypatch.setattr('app.api.lookup_offline', lambda city: None)
+
+
+def test_loads_accepts_bytes_and_str():
+    assert loads(b'{"a": [1, 2]}') == {'a': [1, 2]}
+    assert loads('{"a": null}') == {'a': None}
+
+def test_project_keeps_requested_fields():
+    payload = {'current': {'temperature_2m': 20.0, 'weather_code': 3, 'interval': 900}}
+    assert project(payload, 'current', ['temperature_2m', 'weather_code']) == {'temperature_2m': 20.0, 'weather_code': 3}
+    assert project(payload, 'daily', ['time']) is None
+
+def test_decode_daily_typed_arrays():
+    payload = loads((FIXTURES / 'forecast_london.json').read_bytes())
+    daily = decode_daily(payload, FORECAST_DAILY_FIELDS)
+    assert daily['time'][0] == '2025-06-14'
+    assert isinstance(daily['temperature_2m_max'], array)
+    assert daily['temperature_2m_max'].typecode == 'd'
+    assert list(daily['weather_code']) == [2, 1, 61, 80, 3, 0, 0]
+
+def test_decode_daily_nulls_and_missing_fields():
+    daily = decode_daily({'daily': {'time': ['2025-01-01', '2025-01-02'], 'temperature_2m_max': [1.5, None]}},
+                         ['temperature_2m_max', 'wind_speed_10m_max'])
+    assert daily['temperature_2m_max'][0] == 1.5
+    assert math.isnan(daily['temperature_2m_max'][1])
+    assert len(daily['wind_speed_10m_max']) == 0
+    assert decode_daily({}, ['temperature_2m_max']) is None
+
+def test_is_missing():
+    assert is_missing(None)
+    assert is_missing(math.nan)
+    assert not is_missing(0)
+
+@pytest.mark.asyncio
+async def test_get_forecast_data_from_recorded_payload(remote_only):
+    responses = [fixture_response('geocoding_london.json'), fixture_response('forecast_london.json')]
+    with patch('requests.get', side_effect=responses):
+        forecast = await get_forecast_data('London')
+    assert len(forecast['list']) == 7
+    first = forecast['list'][0]
+    assert first['dt_txt'] == '2025-06-14 12:00:00'
+    assert first['main']['temp'] == pytest.approx((22.1 + 12.4) / 2)
+    assert first['weather'][0] == {'id': 801, 'description': 'partly cloudy'}
+    assert [day['pop'] for day in forecast['list'][:3]] == [0.1, 0.05, 0.78]
+    assert (first['main']['temp_min'], first['main']['temp_max']) == (12.4, 22.1)
+
+@pytest.mark.asyncio
+async def test_get_weather_data_from_recorded_payload(remote_only):
+    responses = [fixture_response('geocoding_london.json'), fixture_response('current_london.json')]
+    with patch('requests.get', side_effect=responses):
+        weather = await get_weather_data('London')
+    assert weather['name'] == 'London'
+    assert weather['main']['temp'] == 21.4
+    assert weather['weather'][0]['id'] == 801
+
+@pytest.mark.asyncio
+async def test_get_coordinates_invalid_json(remote_only):
+    response = MagicMock(content=b'not json')
+    with patch('requests.get', return_value=response):
+        assert await get_coordinates('London') == (None, None, None)
+
+@pytest.mark.asyncio
+async def test_get_coordinates_connection_error(remote_only):
+    import requests
+    with patch('requests.get', side_effect=requests.ConnectionError('offline')):
+        assert await get_coordinates('London') == (None, None, None)
+
+@pytest.mark.asyncio
+async def test_get_coordinates_is_cached(remote_only):
+    with patch('requests.get', return_value=fixture_response('geocoding_london.json')) as mock_get:
+        first = await get_coordinates('London')
+        second = await get_coordinates('  london ')
+    assert first == second == (51.50853, -0.12574, 'London')
+    assert mock_get.call_count == 1
+
+def test_suggest_cities_from_gazetteer():
+    suggestions = suggest_cities('spring')
+    assert suggestions and all(loc['name'].startswith('Springfield') for loc in suggestions)
+
+def test_suggest_cities_merges_gazetteer_and_geocoded_places():
+    get_city_index().add_all([
+        {'name': 'Springfield Gardens', 'country': 'United States', 'admin1': 'New York',
+         'latitude': 40.66, 'longitude': -73.76, 'population': 1},
+        {'name': 'Springfield', 'country': 'United States', 'admin1': 'Illinois',
+         'latitude': 39.80172, 'longitude': -89.64371, 'population': 116250},
+    ])
+    suggestions = suggest_cities('springf', limit=50)
+    names = [(loc['name'], loc['admin1']) for loc in suggestions]
+    assert names.count(('Springfield', 'Illinois')) == 1  # Known to both, listed once
+    assert names[-1] == ('Springfield Gardens', 'New York')
+
+@pytest.mark.asyncio
+async def test_fetch_city_suggestions_feeds_index():
+    with patch('requests.get', return_value=fixture_response('geocoding_london.json')):
+        locations = await fetch_city_suggestions('Lond')
+    assert locations[0]['country'] == 'United Kingdom'
+    assert suggest_cities('lond')[0]['name'] == 'London'
+
+@pytest.mark.asyncio
+async def test_search_locations_fetches_candidates_once(remote_only):
+    with patch('requests.get', return_value=fixture_response('geocoding_london.json')) as mock_get:
+        first = await search_locations('London')
+        second = await search_locations('London')
+    assert first == second
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs['params']['count'] == 5
+
+@pytest.mark.asyncio
+async def test_search_locations_offline_returns_all_matches():
+    with patch('requests.get') as mock_get:
+        locations = await search_locations('Springfield')
+    mock_get.assert_not_called()
+    assert len(locations) == 3
+
+@pytest.mark.asyncio
+async def test_get_weather_data_with_location_skips_geocoding():
+    location = {'name': 'Somewhere', 'latitude': 0.0, 'longitude': 0.0}
+    with patch('requests.get', return_value=fixture_response('current_london.json')) as mock_get:
+        weather = await get_weather_data('ignored', location)
+    assert mock_get.call_count == 1
+    assert weather['name'] == 'Somewhere'
+
+
+@pytest.mark.asyncio
+async def test_get_air_quality_data_parses_and_caches_nearby():
+    location = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    nearby = {'name': 'Westminster', 'latitude': 51.4975, 'longitude': -0.1357}
+    with patch('requests.get', return_value=fixture_response('air_quality_london.json')) as mock_get:
+        first = await get_air_quality_data('London', location)
+        second = await get_air_quality_data('Westminster', nearby)
+    assert mock_get.call_count == 1
+    assert first == second
+    assert first['european_aqi'] == 34 and first['uv_index'] == 6.15
+    assert first['pollen'] == {'alder': 0.0, 'birch': 0.3, 'grass': 41.2}  # ragweed is null here
+
+@pytest.mark.asyncio
+async def test_get_air_quality_data_upstream_error():
+    import requests
+    location = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    with patch('requests.get', side_effect=requests.Timeout('slow')):
+        assert await get_air_quality_data('London', location) is None
+
+
+@pytest.fixture
+def history_store(tmp_path, monkeypatch):
+    store = TimeSeriesStore(str(tmp_path), HISTORY_DAILY_FIELDS)
+    monkeypatch.setattr('app.api.history_store', store)
+    return store
+
+
+def archive_response(url, params):
+    # Slice the recorded January 2024 archive to the requested dates
+    payload = json.loads((FIXTURES / 'archive_london.json').read_bytes())
+    daily = payload['daily']
+    keep = [i for i, day in enumerate(daily['time']) if params['start_date'] <= day <= params['end_date']]
+    payload['daily'] = {field: [values[i] for i in keep] for field, values in daily.items()}
+    return MagicMock(content=json.dumps(payload).encode('utf-8'))
+
+LONDON = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+
+@pytest.mark.asyncio
+async def test_get_history_data_from_archive(history_store):
+    with patch('requests.get', side_effect=archive_response) as mock_get:
+        history = await get_history_data('London', date(2024, 1, 1), date(2024, 1, 10), LONDON)
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs['params']['start_date'] == '2024-01-01'
+    assert len(history['days']) == 10
+    assert history['days'][0] == {
+        'date': '2024-01-01', 'temp_max': 10.9, 'temp_min': 6.2, 'precipitation': 4.3, 'wind_speed': 8.1,
+        'weather': {'id': 500, 'description': 'slight rain'},
+    }
+
+@pytest.mark.asyncio
+async def test_get_history_data_fetches_only_gaps(history_store):
+    with patch('requests.get', side_effect=archive_response):
+        await get_history_data('London', date(2024, 1, 4), date(2024, 1, 6), LONDON)
+    with patch('requests.get', side_effect=archive_response) as mock_get:
+        history = await get_history_data('London', date(2024, 1, 1), date(2024, 1, 10), LONDON)
+    assert [call.kwargs['params']['start_date'] for call in mock_get.call_args_list] == ['2024-01-01', '2024-01-07']
+    assert [call.kwargs['params']['end_date'] for call in mock_get.call_args_list] == ['2024-01-03', '2024-01-10']
+    assert [day['date'] for day in history['days']] == [f'2024-01-{d:02d}' for d in range(1, 11)]
+    with patch('requests.get') as mock_get:
+        await get_history_data('London', date(2024, 1, 2), date(2024, 1, 9), LONDON)
+    mock_get.assert_not_called()
+
+# Another worker process holding a location's history lock until its stdin closes, or for 2 s
+HOLD_LOCK = """
+import fcntl, select, sys
+with open(sys.argv[1], 'a') as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    print('locked', flush=True)
+    select.select([sys.stdin], [], [], 2)
+"""
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(fcntl is None, reason='needs flock')
+async def test_get_history_data_waits_for_another_process_off_the_event_loop(history_store, tmp_path):
+    with patch('requests.get', side_effect=archive_response):
+        await get_history_data('London', date(2024, 1, 1), date(2024, 1, 3), LONDON)
+    holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, str(tmp_path / '51.51_-0.13' / LOCK_FILE)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        assert holder.stdout.readline() == b'locked\n'
+        loading = asyncio.ensure_future(get_history_data('London', date(2024, 1, 1), date(2024, 1, 3), LONDON))
+        started = time.perf_counter()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        # The event loop kept running while the history waited for the other worker
+        assert time.perf_counter() - started < 0.5
+        assert not loading.done()
+    finally:
+        holder.stdin.close()
+        holder.wait()
+    assert len((await loading)['days']) == 3
+
+@pytest.mark.asyncio
+async def test_get_history_data_stops_at_archive_delay(history_store):
+    today = date.today()
+    with patch('requests.get') as mock_get:
+        assert await get_history_data('London', today, today, LONDON) is None
+    mock_get.assert_not_called()
+
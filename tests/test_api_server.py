@@ -0,0 +1,82 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from starlette.testclient import TestClient
+
+from api_server import app
+from app.api import FORECAST_TTL_SECONDS, WEATHER_TTL_SECONDS, clear_caches
+from tests.conftest import fixture_response
+
+
+def upstream(url, params):
+    # Answer like Open-Meteo: current conditions or the daily forecast
+    return fixture_response('current_london.json' if 'current' in params else 'forecast_london.json')
+
+
+@pytest.fixture
+def client():
+    clear_caches()
+    with TestClient(app) as client:
+        yield client
+    clear_caches()
+
+
+def max_age(response):
+    return int(response.headers['cache-control'].split('max-age=')[1])
+
+
+def test_current_by_city_with_etag(client):
+    with patch('requests.get', side_effect=upstream) as mock_get:
+        response = client.get('/v1/current', params={'city': 'London'})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['location']['country'] == 'United Kingdom'  # From the bundled gazetteer
+    assert body['current']['name'] == 'London'
+    # Wind in m/s, like /v1/forecast
+    assert mock_get.call_args.kwargs['params']['wind_speed_unit'] == 'ms'
+    assert body['current']['wind']['speed'] == 3.81
+    assert response.headers['cache-control'].startswith('public, max-age=')
+    assert WEATHER_TTL_SECONDS - 1 <= max_age(response) <= WEATHER_TTL_SECONDS
+    assert response.headers['etag'].startswith('"')
+
+def test_not_modified_and_shared_cache(client):
+    with patch('requests.get', side_effect=upstream) as mock_get:
+        first = client.get('/v1/forecast', params={'lat': '51.51', 'lon': '-0.13'})
+        again = client.get('/v1/forecast', params={'lat': '51.51', 'lon': '-0.13'},
+                           headers={'If-None-Match': first.headers['etag']})
+    assert mock_get.call_count == 1  # The second request is served from the engine's cache
+    assert len(first.json()['forecast']) == 7
+    assert again.status_code == 304 and again.content == b''
+    assert FORECAST_TTL_SECONDS - 1 <= max_age(again) <= FORECAST_TTL_SECONDS
+
+def test_max_age_is_the_remaining_cache_lifetime(client):
+    with patch('requests.get', side_effect=upstream) as mock_get:
+        client.get('/v1/forecast', params={'lat': '51.51', 'lon': '-0.13'})
+        with patch('api_server.time') as clock:
+            clock.time.return_value = time.time() + 600  # Ten minutes later, still within the TTL
+            later = client.get('/v1/forecast', params={'lat': '51.51', 'lon': '-0.13'})
+            batch = client.post('/v1/batch', json={'cities': ['London'], 'include': ['forecast']})
+    assert mock_get.call_count == 1
+    assert FORECAST_TTL_SECONDS - 601 <= max_age(later) <= FORECAST_TTL_SECONDS - 600
+    assert max_age(batch) == max_age(later)
+
+def test_batch_resolves_each_city_once(client):
+    with patch('requests.get', side_effect=upstream) as mock_get:
+        response = client.post('/v1/batch', json={'cities': ['London', 'Paris', 'London'], 'include': ['current']})
+    results = response.json()['results']
+    assert [result['query'] for result in results] == ['London', 'Paris', 'London']
+    assert all('current' in result and 'forecast' not in result for result in results)
+    assert mock_get.call_count == 2  # One current-conditions call per distinct city, no geocoding
+
+def test_errors(client):
+    assert client.get('/v1/current').status_code == 400
+    assert client.get('/v1/current', params={'lat': '91', 'lon': '0'}).status_code == 400
+    assert client.post('/v1/batch', json={'cities': 'London'}).status_code == 400
+    assert client.post('/v1/batch', json={'cities': ['London'], 'include': ['radar']}).status_code == 400
+    with patch('app.api.lookup_offline', return_value=[]), \
+            patch('requests.get', return_value=MagicMock(content=b'{"generationtime_ms": 0.1}')):
+        assert client.get('/v1/current', params={'city': 'Atlantis'}).status_code == 404
+    import requests
+    with patch('requests.get', side_effect=requests.ConnectionError('offline')):
+        assert client.get('/v1/current', params={'lat': '10', 'lon': '10'}).status_code == 502
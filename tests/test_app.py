@@ -1,26 +1,17 @@
+import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, call
 import unittest.mock # Import unittest.mock explicitly for patching
-
-# Mock the Q object for testing
-class MockQ:
-    def __init__(self):
-        # Use MagicMock for page to track assignments
-        self.page = MagicMock()
-        self.args = MagicMock()
-        self.client = MagicMock()
-        self.events = MagicMock()
-        self.page.save = AsyncMock()
-
-    async def page_save(self):
-        await self.page.save()
+from datetime import date
 
 # Assuming main.py and app.utils are in the parent directory
 # We need to make sure the imports work relative to the project root or adjust sys.path in tests
 # For now, assuming the existing imports in test_app.py work.
 # If not, we might need to adjust the test setup or folder structure.
-from main import weather_icon, get_weather_emoji, main_app, search_view, weather_view, forecast_view, forecast_chart_view, error_view, handle_clear, handle_toggle_unit, handle_toggle_theme, handle_search
+from main import weather_icon, get_weather_emoji, main_app, search_view, weather_view, forecast_view, forecast_chart_view, error_view, handle_clear, handle_toggle_unit, handle_toggle_theme, handle_search, handle_pick, handle_history, history_range, aqi_level, uv_level, handle_watch, handle_add_alert
+from app.session import sessions
 from app.utils import convert_temperature, format_weather_data
+from tests.conftest import FIXTURES, MockQ
 
 def test_convert_temperature():
     # Test Celsius to Fahrenheit conversion
@@ -89,6 +80,16 @@ def test_main_app():
     q.page.__setitem__.assert_any_call('footer', unittest.mock.ANY)
     assert q.client.theme == 'h2o-dark' # Check if theme is initialized or used
 
+def test_main_app_reuses_static_cards():
+    first, second = MockQ(), MockQ()
+    first.client.theme = second.client.theme = 'h2o-dark'
+    main_app(first)
+    main_app(second)
+    cards_a = [call.args for call in first.page.__setitem__.call_args_list]
+    cards_b = [call.args for call in second.page.__setitem__.call_args_list]
+    assert [key for key, _ in cards_a] == ['layout', 'header', 'footer']
+    assert all(a is b for (_, a), (_, b) in zip(cards_a, cards_b))  # Built once, shared by clients
+
 def test_search_view():
     q = MockQ()
     q.args.search = "TestCity" # Simulate a previous search
@@ -119,7 +120,7 @@ async def test_handle_clear():
     await handle_clear(q)
 
     # Check if cards are attempted to be deleted
-    assert q.page.__delitem__.call_count == 5 # weather, forecast, forecast_chart, error, search
+    assert q.page.__delitem__.call_count == 9 # weather, forecast, forecast_chart, error, search, suggestions, locations, history, air_quality
 
     # Check if search box value and toggle unit value are reset
     assert mock_search_card.search.value == ''
@@ -219,4 +220,165 @@ def test_error_view():
 # Add test cases for forecast_view and forecast_chart_view similarly,
 # by providing mock_forecast_data and checking the added cards and their content.
 # Note that forecast_chart_view has fallback logic, so you might need tests
-# that simulate failures in ui.plot_card creation if you want to test the text fallback. 
\ No newline at end of file
+# that simulate failures in ui.plot_card creation if you want to test the text fallback.
+
+PARIS_CANDIDATES = [
+    {'name': 'Paris', 'country': 'France', 'admin1': 'Île-de-France', 'latitude': 48.85341, 'longitude': 2.3488, 'population': 2138551},
+    {'name': 'Paris', 'country': 'United States', 'admin1': 'Texas', 'latitude': 33.66094, 'longitude': -95.55551, 'population': 24782},
+]
+MOCK_WEATHER = {
+    'name': 'Paris',
+    'main': {'temp': 25, 'humidity': 70, 'pressure': 1012, 'feels_like': 26},
+    'wind': {'speed': 3},
+    'weather': [{'id': 800, 'description': 'clear sky'}]
+}
+MOCK_AIR_QUALITY = {'european_aqi': 34, 'us_aqi': 47, 'pm10': 17.3, 'pm2_5': 9.8, 'uv_index': 6.15,
+                    'pollen': {'grass': 41.2}}
+
+@pytest.mark.asyncio
+async def test_handle_search_geocodes_once_and_offers_choice():
+    q = MockQ()
+    q.args.search = "Paris"
+    q.client.location = None
+    with unittest.mock.patch('main.search_locations', new_callable=AsyncMock, return_value=PARIS_CANDIDATES) as mock_search, \
+            unittest.mock.patch('main.get_weather_data', new_callable=AsyncMock, return_value=MOCK_WEATHER) as mock_weather, \
+            unittest.mock.patch('main.get_forecast_data', new_callable=AsyncMock, return_value=None) as mock_forecast, \
+            unittest.mock.patch('main.get_air_quality_data', new_callable=AsyncMock, return_value=MOCK_AIR_QUALITY) as mock_air:
+        await handle_search(q)
+    mock_search.assert_called_once_with("Paris")
+    # All fetches reuse the resolved coordinates
+    mock_weather.assert_called_once_with("Paris", PARIS_CANDIDATES[0])
+    mock_forecast.assert_called_once_with("Paris", PARIS_CANDIDATES[0])
+    mock_air.assert_called_once_with("Paris", PARIS_CANDIDATES[0])
+    q.page.__setitem__.assert_any_call('locations', unittest.mock.ANY)
+    q.page.__setitem__.assert_any_call('air_quality', unittest.mock.ANY)
+    assert q.client.location == PARIS_CANDIDATES[0]
+
+@pytest.mark.asyncio
+async def test_handle_pick_reuses_candidate_without_geocoding():
+    q = MockQ()
+    q.client.location_candidates = PARIS_CANDIDATES
+    with unittest.mock.patch('main.search_locations', new_callable=AsyncMock) as mock_search, \
+            unittest.mock.patch('main.get_weather_data', new_callable=AsyncMock, return_value=MOCK_WEATHER) as mock_weather, \
+            unittest.mock.patch('main.get_forecast_data', new_callable=AsyncMock, return_value=None), \
+            unittest.mock.patch('main.get_air_quality_data', new_callable=AsyncMock, return_value=None):
+        await handle_pick(q, q.client.location_candidates, '1')
+    mock_search.assert_not_called()
+    mock_weather.assert_called_once_with("Paris", PARIS_CANDIDATES[1])
+    assert q.client.location == PARIS_CANDIDATES[1]
+
+def test_history_range():
+    assert history_range('last_30_days', date(2025, 3, 31)) == (date(2025, 2, 25), date(2025, 3, 26))
+    assert history_range('last_year', date(2024, 2, 29)) == (date(2023, 2, 25), date(2023, 3, 3))
+
+@pytest.mark.asyncio
+async def test_handle_history_uses_chosen_location():
+    q = MockQ()
+    q.args.history = 'last_30_days'
+    q.client.location = PARIS_CANDIDATES[1]
+    q.client.temperature_unit = 'C'
+    history = {'name': 'Paris', 'start': '2025-01-01', 'end': '2025-01-01', 'days': [{
+        'date': '2025-01-01', 'temp_max': 20.0, 'temp_min': 10.0, 'precipitation': 0.0, 'wind_speed': 2.0,
+        'weather': {'id': 800, 'description': 'clear sky'}}]}
+    with unittest.mock.patch('main.search_locations', new_callable=AsyncMock) as mock_search, \
+            unittest.mock.patch('main.get_history_data', new_callable=AsyncMock, return_value=history) as mock_history:
+        await handle_history(q)
+    mock_search.assert_not_called()
+    assert mock_history.call_args.args[0] == 'Paris'
+    assert mock_history.call_args.args[3] is PARIS_CANDIDATES[1]
+    q.page.__setitem__.assert_any_call('history', unittest.mock.ANY)
+
+def test_air_quality_levels():
+    assert aqi_level(34) == '🟢 Fair'
+    assert aqi_level(None) == 'Unknown'
+    assert uv_level(6.15) == 'High'
+    assert uv_level(11) == 'Extreme'
+
+@pytest.mark.asyncio
+async def test_watch_and_add_alert():
+    from app.alerts import alerts
+    q = MockQ()
+    q.page.url = '/alerts-test'
+    q.client.location = PARIS_CANDIDATES[0]
+    q.client.favorite_locations = []
+    q.client.temperature_unit = 'C'
+    await handle_watch(q)
+    await handle_watch(q)  # Watching twice keeps one favorite
+    assert q.client.favorite_locations == [PARIS_CANDIDATES[0]]
+
+    q.args.alert_city, q.args.alert_metric, q.args.alert_threshold = '0', 'wind', '36'
+    forecast = {'list': [{'dt_txt': '2025-06-14 12:00:00', 'pop': 0.1, 'wind': {'speed': 12.0},
+                          'main': {'temp': 15, 'temp_min': 10, 'temp_max': 20}}]}
+    try:
+        with unittest.mock.patch('main.get_forecast_data', new_callable=AsyncMock, return_value=forecast):
+            await handle_add_alert(q)
+        (rule, hit), = alerts.alerts_for('/alerts-test')
+        assert rule.threshold == pytest.approx(10.0)  # 36 km/h stored as m/s
+        assert hit['date'] == '2025-06-14'
+        q.page.__setitem__.assert_any_call('alerts', unittest.mock.ANY)
+        sessions.sweep(now=float('inf'))  # Idle sessions keep their rules
+        assert alerts.rules_for('/alerts-test')
+        sessions.disconnect('/alerts-test')
+        assert alerts.rules_for('/alerts-test') == []
+    finally:
+        alerts.discard_owner('/alerts-test')
+
+
+def open_meteo_forecast(url, params):
+    # The recorded forecast is in km/h, Open-Meteo's default; convert it like the API does for 'ms'
+    payload = json.loads((FIXTURES / 'forecast_london.json').read_bytes())
+    if params.get('wind_speed_unit') == 'ms':
+        payload['daily']['wind_speed_10m_max'] = [speed / 3.6 for speed in payload['daily']['wind_speed_10m_max']]
+        payload['daily_units']['wind_speed_10m_max'] = 'm/s'
+    return unittest.mock.MagicMock(content=json.dumps(payload).encode('utf-8'))
+
+@pytest.mark.asyncio
+async def test_wind_alert_threshold_matches_recorded_forecast():
+    from app.alerts import alerts
+    from app.api import clear_caches
+    q = MockQ()
+    q.page.url = '/wind-test'
+    q.client.temperature_unit = 'C'
+    q.client.favorite_locations = [{'name': 'London', 'country': 'United Kingdom', 'admin1': 'England',
+                                    'latitude': 51.50853, 'longitude': -0.12574}]
+    q.args.alert_city, q.args.alert_metric = '0', 'wind'
+    clear_caches()
+    try:
+        with unittest.mock.patch('requests.get', side_effect=open_meteo_forecast):
+            q.args.alert_threshold = '50'  # Above the 24.8 km/h peak of the recorded week
+            await handle_add_alert(q)
+            assert alerts.alerts_for('/wind-test') == []
+            q.args.alert_threshold = '20'
+            await handle_add_alert(q)
+        (rule, hit), = alerts.alerts_for('/wind-test')
+        assert hit['date'] == '2025-06-16'
+        assert hit['value'] * 3.6 == pytest.approx(24.8)
+    finally:
+        alerts.discard_owner('/wind-test')
+        clear_caches()
+
+
+def open_meteo_current(url, params):
+    # The recorded conditions are in m/s; Open-Meteo answers in km/h unless asked for 'ms'
+    payload = json.loads((FIXTURES / 'current_london.json').read_bytes())
+    if params.get('wind_speed_unit') != 'ms':
+        payload['current']['wind_speed_10m'] = round(payload['current']['wind_speed_10m'] * 3.6, 2)
+        payload['current_units']['wind_speed_10m'] = 'km/h'
+    return unittest.mock.MagicMock(content=json.dumps(payload).encode('utf-8'))
+
+@pytest.mark.asyncio
+async def test_current_wind_shown_in_metres_per_second():
+    from app.api import clear_caches, get_weather_data
+    london = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    clear_caches()
+    try:
+        with unittest.mock.patch('requests.get', side_effect=open_meteo_current):
+            weather = await get_weather_data('London', london)
+    finally:
+        clear_caches()
+    q = MockQ()
+    q.client.temperature_unit = 'C'
+    weather_view(q, weather)
+    card = next(args[1] for args, _ in q.page.__setitem__.call_args_list if args[0] == 'weather')
+    texts = [item['text']['content'] for item in card.dump()['items'] if 'text' in item]
+    assert '**💨 Wind Speed:** 3.81 m/s' in texts
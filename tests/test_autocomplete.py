@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import ANY, AsyncMock, patch
+
+import pytest
+
+from app.autocomplete import CityIndex, location_label
+from app.utils import normalize_city_name
+from main import handle_suggest
+from tests.conftest import MockQ
+
+
+def make_location(name, country='', admin1='', lat=0.0, lon=0.0, population=0):
+    return {'name': name, 'country': country, 'admin1': admin1,
+            'latitude': lat, 'longitude': lon, 'population': population}
+
+def suggest_q(search):
+    q = MockQ()
+    q.args.search = search
+    q.client.suggest_seq = 0
+    return q
+
+
+def test_normalize_city_name():
+    assert normalize_city_name('  São   Paulo ') == 'sao paulo'
+    assert normalize_city_name('ZÜRICH') == 'zurich'
+    assert normalize_city_name('Stratford-upon-Avon') == 'stratford upon avon'
+
+def test_city_index_prefix_ranked_by_population():
+    index = CityIndex()
+    index.add_all([
+        make_location('Paris', 'United States', 'Texas', 33.66, -95.56, 24782),
+        make_location('Paris', 'France', 'Île-de-France', 48.85, 2.35, 2138551),
+        make_location('Parma', 'Italy', lat=44.8, lon=10.33, population=175895),
+        make_location('London', 'United Kingdom', lat=51.5, lon=-0.13, population=8961989),
+    ])
+    names = [(loc['name'], loc['country']) for loc in index.complete('par')]
+    assert names == [('Paris', 'France'), ('Parma', 'Italy'), ('Paris', 'United States')]
+    assert index.complete('par', limit=1)[0]['country'] == 'France'
+    assert index.complete('xyz') == []
+    assert index.complete('   ') == []
+
+def test_city_index_deduplicates_places():
+    index = CityIndex()
+    index.add(make_location('London', lat=51.50853, lon=-0.12574))
+    index.add(make_location('London', lat=51.5085, lon=-0.1257))
+    assert len(index) == 1
+
+def test_city_index_evicts_least_recently_used():
+    index = CityIndex(max_entries=2)
+    index.add(make_location('Lima', lat=-12.04, lon=-77.03))
+    index.add(make_location('Lyon', lat=45.75, lon=4.85))
+    assert index.complete('lim')  # Lima is now the most recently used
+    index.add(make_location('Linz', lat=48.31, lon=14.29))
+    assert len(index) == 2
+    assert index.complete('ly') == []
+    assert [loc['name'] for loc in index.complete('li')] == ['Lima', 'Linz']
+
+def test_location_label():
+    assert location_label(make_location('Paris', 'France', 'Île-de-France')) == 'Paris, Île-de-France, France'
+    assert location_label(make_location('Singapore', 'Singapore', 'Singapore')) == 'Singapore'
+
+@pytest.mark.asyncio
+async def test_handle_suggest_local_hit_skips_upstream():
+    q = suggest_q('Lond')
+    local = [make_location('London', 'United Kingdom')]
+    with patch('main.suggest_cities', return_value=local), \
+            patch('main.fetch_city_suggestions', new_callable=AsyncMock) as mock_fetch:
+        await handle_suggest(q)
+    mock_fetch.assert_not_called()
+    q.page.__setitem__.assert_any_call('suggestions', ANY)
+    q.page.save.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_handle_suggest_debounces_upstream_lookups():
+    q = suggest_q('Zzyz')
+    with patch('main.SUGGEST_DEBOUNCE_SECONDS', 0.05), \
+            patch('main.suggest_cities', return_value=[]), \
+            patch('main.fetch_city_suggestions', new_callable=AsyncMock, return_value=[]) as mock_fetch:
+        first = asyncio.ensure_future(handle_suggest(q))
+        await asyncio.sleep(0)
+        q.args.search = 'Zzyzx'
+        await asyncio.gather(first, handle_suggest(q))
+    # Only the last keystroke reaches the geocoding API
+    mock_fetch.assert_called_once_with('Zzyzx')
+
+
+
+@pytest.mark.asyncio
+async def test_only_search_box_events_ask_for_suggestions():
+    from h2o_wave.core import Expando
+    import main
+    from app.session import sessions
+    from app.testing import FakePage, FakeQ
+
+    page, client = FakePage('/suggest-routing'), Expando()
+    try:
+        await main.serve(FakeQ(page, client, {}))
+        with patch('main.handle_suggest', new_callable=AsyncMock) as mock_suggest:
+            # Unchecking a toggle still sends the search box's text
+            await main.serve(FakeQ(page, client, {'search': 'Lon', 'toggle_unit': False,
+                                                  '__wave_submission_name__': 'toggle_unit'}))
+            mock_suggest.assert_not_called()
+            await main.serve(FakeQ(page, client, {'search': 'Lon', '__wave_submission_name__': 'search'}))
+            mock_suggest.assert_called_once()
+    finally:
+        sessions.discard('/suggest-routing')
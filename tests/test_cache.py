@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.cache import CacheBackend, MemoryCache, SQLiteCache, SQLiteStore, make_cache
+
+
+def test_memory_cache_expires_and_evicts():
+    cache = MemoryCache(ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)  # 'b' is the least recently used
+    assert cache.get('b') is None
+    assert dict(cache.items()) == {'a': 1, 'c': 3}
+    assert time.time() + 59 < cache.expires_at('a') <= time.time() + 60
+    assert cache.expires_at('b') is None
+    with patch('app.cache.time.monotonic', return_value=time.monotonic() + 61):
+        assert cache.expires_at('a') is None
+        assert cache.get('a') is None
+
+def test_incomplete_backend_fails_when_created():
+    class NoExpiry(CacheBackend):
+        get = set = items = clear = lambda self, *args: None
+
+    with pytest.raises(TypeError, match='expires_at'):
+        NoExpiry()
+
+def test_sqlite_cache_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    # Two stores on one file stand in for two worker processes
+    worker_a = SQLiteCache(SQLiteStore(path), 'weather', ttl=60)
+    worker_b = SQLiteCache(SQLiteStore(path), 'weather', ttl=60)
+    worker_a.set('51.51,-0.13', {'name': 'London', 'main': {'temp': 21.4}})
+    assert worker_b.get('51.51,-0.13') == {'name': 'London', 'main': {'temp': 21.4}}
+    assert dict(worker_b.items()) == {'51.51,-0.13': {'name': 'London', 'main': {'temp': 21.4}}}
+
+def test_sqlite_cache_namespaces_and_expiry(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'cache.sqlite3'))
+    weather = SQLiteCache(store, 'weather', ttl=60)
+    forecast = SQLiteCache(store, 'forecast', ttl=60)
+    weather.set('k', [1, 2])
+    assert forecast.get('k') is None
+    assert time.time() + 59 < weather.expires_at('k') <= time.time() + 60
+    assert forecast.expires_at('k') is None
+    with patch('app.cache.time.time', return_value=time.time() + 61):
+        assert weather.get('k') is None
+        assert weather.expires_at('k') is None
+    weather.clear()
+    assert list(weather.items()) == []
+
+def test_make_cache_backends(tmp_path):
+    assert isinstance(make_cache('geocode', ttl=1, backend='memory'), MemoryCache)
+    cache = make_cache('geocode', ttl=1, backend='sqlite', path=str(tmp_path / 'c.sqlite3'))
+    assert isinstance(cache, SQLiteCache)
+    with pytest.raises(ValueError):
+        make_cache('geocode', ttl=1, backend='memcached')
+
+def test_sqlite_cache_treats_locked_database_as_miss(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(SQLiteStore(path), 'weather', ttl=60)
+    cache.set('k', 1)
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute('BEGIN EXCLUSIVE')  # Holds the write lock
+    try:
+        started = time.perf_counter()
+        cache.set('k', 2)  # Skipped instead of waiting seconds for the lock
+        assert time.perf_counter() - started < 1
+    finally:
+        other_worker.execute('ROLLBACK')
+        other_worker.close()
+    assert cache.get('k') == 1
+
+@pytest.mark.asyncio
+async def test_async_calls_run_sqlite_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(SQLiteStore(str(tmp_path / 'cache.sqlite3')), 'weather', ttl=60)
+    threads = []
+    execute = cache.store.execute
+
+    def record_thread(*args):
+        threads.append(threading.get_ident())
+        return execute(*args)
+
+    with patch.object(cache.store, 'execute', side_effect=record_thread):
+        await cache.set_async('k', {'temp': 21.4})
+        assert await cache.get_async('k') == {'temp': 21.4}
+        assert await cache.items_async() == [('k', {'temp': 21.4})]
+    assert threads and threading.get_ident() not in threads
+    memory = MemoryCache(ttl=60)
+    await memory.set_async('k', 1)
+    assert await memory.get_async('k') == 1
@@ -0,0 +1,106 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import api
+from app.cassette import PIPELINE_CASSETTE, Cassette, CassetteError, use_cassette
+from app.session import sessions
+from app.testing import FakePage, FakeQ, run_searches
+
+# Replay latencies are stretched so a lost overlap between fetches stands out from scheduling noise
+REPLAY_SPEED = 3
+OVERHEAD_BUDGET = 0.05  # Seconds a search may spend outside upstream calls
+
+
+def slow_download(url, params):
+    time.sleep(0.02)
+    return b'{"ok": true}'
+
+
+def test_record_then_replay_with_timing(tmp_path):
+    path = str(tmp_path / 'exchanges.json.gz')
+    recorder = Cassette(path, mode='record')
+    assert recorder.fetch('http://127.0.0.1:1/v1/forecast', {'latitude': 1.5}, slow_download) == b'{"ok": true}'
+    assert recorder.fetch('http://127.0.0.1:1/v1/forecast', {'latitude': 2.5}, slow_download) == b'{"ok": true}'
+    assert not os.path.exists(path)  # Written once on close, not per call
+    recorder.close()
+
+    player = Cassette(path, speed=1)
+    started = time.perf_counter()
+    # Same path and params on another host still match
+    assert player.fetch('https://api.open-meteo.com/v1/forecast', {'latitude': '1.5'}, None) == b'{"ok": true}'
+    assert time.perf_counter() - started >= 0.02
+    with pytest.raises(CassetteError):
+        player.fetch('https://api.open-meteo.com/v1/forecast', {'latitude': 2}, None)
+    assert len(player.interactions) == 2
+    assert (player.hits, player.misses) == (1, 1)
+
+def test_recorded_failure_replays_as_upstream_error(tmp_path):
+    path = str(tmp_path / 'failure.json.gz')
+
+    def failing_download(url, params):
+        raise api.UpstreamError('503 Service Unavailable')
+
+    recorder = Cassette(path, mode='record')
+    with pytest.raises(api.UpstreamError):
+        recorder.fetch('https://api.open-meteo.com/v1/forecast', {}, failing_download)
+    recorder.close()
+    use_cassette(Cassette(path, speed=0))
+    try:
+        with pytest.raises(api.UpstreamError, match='Recorded failure'):
+            api._get_json('https://api.open-meteo.com/v1/forecast', {})
+    finally:
+        use_cassette(None)
+
+
+@pytest.fixture
+def replay():
+    cassette = Cassette(PIPELINE_CASSETTE, speed=REPLAY_SPEED)
+    use_cassette(cassette)
+    sessions.clear()
+    with patch('requests.get', side_effect=AssertionError('network access during replay')):
+        yield cassette
+    use_cassette(None)
+    sessions.clear()
+    api.clear_caches()
+
+
+def latency_budget(played):
+    """Geocoding first, then weather, forecast and air quality concurrently."""
+    geocoding = sum(call['elapsed'] for call in played if call['url'].endswith('/search'))
+    fetches = max(call['elapsed'] for call in played if not call['url'].endswith('/search'))
+    return (geocoding + fetches) * REPLAY_SPEED + OVERHEAD_BUDGET
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('city, upstream_calls', [
+    ('London', 3),       # Bundled gazetteer: no geocoding call
+    ('Springfield', 3),  # Ambiguous, still one lookup
+    ('Oakhaven', 4),     # Geocoded once, then the three fetches
+])
+async def test_search_pipeline_budgets(replay, city, upstream_calls):
+    (_, seconds, calls, page), = await run_searches([city])
+    assert replay.misses == 0
+    assert calls == upstream_calls
+    assert seconds <= latency_budget(replay.played)
+
+    weather = page['weather'].dump()
+    assert weather['title'].endswith(f'Weather in {city}')
+    rows = page['forecast'].dump()['items'][0]['table']['rows']
+    assert len(rows) == 7
+    assert page['air_quality'].dump()['items'][0]['text']['content'].startswith('**European AQI:** 34')
+
+@pytest.mark.asyncio
+async def test_repeat_search_is_served_from_cache(replay):
+    from h2o_wave.core import Expando
+    import main
+
+    await run_searches(['Paris'])
+    page, client = FakePage('/again'), Expando()
+    await main.serve(FakeQ(page, client, {}))
+    calls = replay.hits
+    await main.serve(FakeQ(page, client, {'search': 'Paris', 'search_button': True}))
+    assert replay.hits == calls  # No upstream call, so no recorded latency to wait for
+    assert page['weather'].dump()['title'].endswith('Weather in Paris')
@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+
+from app import gazetteer
+from app.api import geocode_cache, get_coordinates
+from app.gazetteer import GazetteerIndex, build_index
+
+
+@pytest.fixture
+def index(tmp_path):
+    csv_path = tmp_path / 'cities.csv'
+    csv_path.write_text(
+        'name,country,admin1,latitude,longitude,population\n'
+        'Paris,France,Île-de-France,48.85341,2.3488,2138551\n'
+        'Paris,United States,Texas,33.66094,-95.55551,24782\n'
+        'São Paulo,Brazil,São Paulo,-23.5475,-46.63611,10021295\n'
+        'London,United Kingdom,England,51.50853,-0.12574,8961989\n',
+        encoding='utf-8'
+    )
+    index_path = tmp_path / 'cities.idx'
+    assert build_index(csv_path, index_path) == 4
+    index = GazetteerIndex(index_path)
+    yield index
+    index.close()
+
+
+def test_lookup_normalized_name(index):
+    city = index.lookup('  sao PAULO ')[0]
+    assert city['name'] == 'São Paulo'
+    assert city['latitude'] == pytest.approx(-23.5475)
+    assert index.lookup('Atlantis') == []
+    assert index.lookup('') == []
+
+def test_lookup_returns_every_match_by_population(index):
+    assert [city['country'] for city in index.lookup('paris')] == ['France', 'United States']
+
+def test_lookup_with_qualifier(index):
+    assert [city['admin1'] for city in index.lookup('Paris, Texas')] == ['Texas']
+    assert index.lookup('Paris, Narnia') == []
+
+def test_complete_prefix_from_sorted_names(index):
+    assert [city['country'] for city in index.complete('pa')] == ['France', 'United States']
+    assert [city['name'] for city in index.complete('S')] == ['São Paulo']
+    assert index.complete('Paris', limit=1)[0]['country'] == 'France'
+    assert index.complete('zz') == []
+    assert index.complete('  ') == []
+
+def test_rebuilds_index_of_older_format(tmp_path):
+    csv_path = tmp_path / 'cities.csv'
+    csv_path.write_text('name,country,admin1,latitude,longitude,population\nOslo,Norway,Oslo,59.91,10.75,580000\n',
+                        encoding='utf-8')
+    index_path = tmp_path / 'cities.idx'
+    build_index(csv_path, index_path)
+    assert not gazetteer._is_stale(index_path, csv_path)
+    index_path.write_bytes(b'WGZ1' + index_path.read_bytes()[4:])
+    assert gazetteer._is_stale(index_path, csv_path)
+
+def test_iterates_all_records(index):
+    assert sorted(city['name'] for city in index) == ['London', 'Paris', 'Paris', 'São Paulo']
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'bogus.idx'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        GazetteerIndex(path)
+
+def test_bundled_index_is_built_on_demand():
+    index = gazetteer.get_index()
+    assert index is not None
+    assert index.lookup('Tokyo')[0]['country'] == 'Japan'
+
+@pytest.mark.asyncio
+async def test_get_coordinates_offline():
+    geocode_cache.clear()
+    with patch('requests.get') as mock_get:
+        lat, lon, name = await get_coordinates('Berlin')
+    mock_get.assert_not_called()
+    assert name == 'Berlin'
+    assert (round(lat), round(lon)) == (53, 13)
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from app.frames import PROJECT_ROOT
+from app.profiler import SamplingProfiler, frame_category
+
+
+def busy_view(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_frame_category():
+    assert frame_category(f'{PROJECT_ROOT}/main.py', 'serve') == 'handler'
+    assert frame_category(f'{PROJECT_ROOT}/main.py', 'handle_search') == 'handler'
+    assert frame_category(f'{PROJECT_ROOT}/main.py', 'forecast_view') == 'view'
+    assert frame_category(f'{PROJECT_ROOT}/app/api.py', 'get_weather_data') == 'fetch'
+    assert frame_category('/usr/lib/python3/json/decoder.py', 'decode') is None
+    # A virtualenv inside the project is still library code
+    assert frame_category(f'{PROJECT_ROOT}/.venv/lib/python3.11/site-packages/main.py', 'serve') is None
+
+def test_profiler_writes_folded_stacks(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_view, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval_ms=1, output_dir=str(tmp_path))
+    try:
+        assert profiler.start(0.2)
+        assert not profiler.start(0.2)  # one window at a time
+        time.sleep(0.3)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    lines = (tmp_path / profiler.last_output.split('/')[-1]).read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert any('busy_view' in line for line in lines)
+    assert not profiler.running
+
+def varied_stacks(stop, depth=0):
+    # New stack shapes keep adding keys to the sample counter
+    while not stop.is_set():
+        if depth < 20:
+            varied_stacks(stop, depth + 1 + int(time.perf_counter() * 1e6) % 3)
+        sum(range(100))
+
+def test_summary_while_sampling(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=varied_stacks, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval_ms=0.1, output_dir=str(tmp_path))
+    try:
+        profiler.start(0.5)
+        while profiler.running:
+            profiler.summary()  # As the admin page does on every render
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    assert sum(profiler.snapshot().values()) > 0
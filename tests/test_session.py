@@ -0,0 +1,86 @@
+import gc
+from unittest.mock import MagicMock
+
+from app.session import SessionState, SessionStore, deep_sizeof
+
+
+class Client:
+    # Stands in for Wave's q.client expando, which Wave drops on disconnect
+    pass
+
+def make_q(url):
+    q = MagicMock()
+    q.page.url = url
+    q.client = Client()
+    return q
+
+
+def test_session_state_defaults_and_slots():
+    state = SessionState()
+    assert not state.initialized
+    assert state.temperature_unit == 'C'
+    assert state.theme == 'h2o-dark'
+    assert 'theme' in state
+    assert 'speed_unit' not in state
+    assert not hasattr(state, '__dict__')
+
+def test_attach_reuses_session_per_client():
+    store = SessionStore()
+    q = make_q('/client-1')
+    first = store.attach(q)
+    first.theme = 'h2o-light'
+    assert store.attach(q) is first
+    assert store.attach(make_q('/client-2')) is not first
+    assert len(store) == 2
+
+def test_session_dropped_with_wave_client():
+    store = SessionStore()
+    q = make_q('/client-1')
+    store.attach(q)
+    q.client = None
+    gc.collect()
+    assert len(store) == 0
+
+def test_disconnect_hooks_run_on_disconnect_only():
+    store = SessionStore(idle_seconds=0, memory_budget=0)
+    departed = []
+    store.on_disconnect(departed.append)
+    q = make_q('/client-1')
+    store.attach(q).suggestions = ['Paris']
+    assert store.sweep(now=float('inf')) == 1  # Compacted, but still connected
+    assert departed == []
+    q.client = None
+    gc.collect()
+    assert departed == ['/client-1']
+
+def test_sweep_compacts_idle_sessions_without_evicting_them():
+    store = SessionStore(idle_seconds=60)
+    old_q = make_q('/old')
+    old, fresh = store.attach(old_q), store.attach(make_q('/fresh'))
+    old.favorite_locations = [{'name': 'Paris', 'latitude': 48.85, 'longitude': 2.35}]
+    old.location_candidates = fresh.location_candidates = old.favorite_locations * 5
+    old.last_seen -= 120
+    assert store.sweep() == 1
+    # The idle client may still be connected: its next event finds its preferences
+    assert store.attach(old_q) is old
+    assert old.favorite_locations and old.location_candidates is None
+    assert fresh.location_candidates is not None
+    assert len(store) == 2
+
+def test_sweep_over_budget_compacts_oldest_first_without_evicting():
+    store = SessionStore()
+    old_q, new_q = make_q('/old'), make_q('/new')
+    old, new = store.attach(old_q), store.attach(new_q)
+    old.last_seen -= 10
+    old.theme = 'h2o-light'
+    for state in (old, new):
+        state.location_candidates = [{'name': 'Paris', 'latitude': 48.85, 'longitude': 2.35}] * 50
+    store.memory_budget = store.memory_bytes() - 1
+    assert store.sweep() == 1
+    assert old.location_candidates is None and new.location_candidates is not None
+    store.memory_budget = 0
+    assert store.sweep() == 1
+    # Still over budget, but connected clients keep their sessions and settings
+    assert store.sweep() == 0
+    assert len(store) == 2
+    assert store.attach(old_q) is old and old.theme == 'h2o-light'
@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.api import clear_caches, get_forecast_data, get_weather_data
+from app.spatial import GridIndex, haversine_km
+from tests.conftest import fixture_response
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+def test_haversine_km():
+    assert haversine_km(51.5, -0.12, 51.5, -0.12) == 0
+    # London to Paris is roughly 340 km
+    assert 330 < haversine_km(51.50853, -0.12574, 48.85341, 2.3488) < 350
+
+def test_grid_nearest_within_radius():
+    grid = GridIndex(cell_degrees=0.1)
+    grid.add('london', 51.50853, -0.12574)
+    grid.add('croydon', 51.38333, -0.1)
+    distance, key = grid.nearest(51.51, -0.13, radius_km=5)
+    assert key == 'london' and distance < 1
+    assert grid.nearest(48.85, 2.35, radius_km=50) is None
+    assert [key for _, key in grid.within(51.45, -0.11, radius_km=20)] == ['london', 'croydon']
+
+def test_grid_crosses_cell_boundaries():
+    grid = GridIndex(cell_degrees=0.1)
+    grid.add('east', 0.0001, 0.0001)
+    assert grid.nearest(-0.0001, -0.0001, radius_km=1)[1] == 'east'
+
+def test_grid_wraps_at_antimeridian():
+    grid = GridIndex(cell_degrees=0.1)
+    grid.add('fiji-east', -16.5, -179.99)
+    distance, key = grid.nearest(-16.5, 179.99, radius_km=5)
+    assert key == 'fiji-east' and distance < 3
+    assert grid.nearest(-16.5, -179.9, radius_km=15)[1] == 'fiji-east'
+
+def test_grid_add_replaces_and_discard_removes():
+    grid = GridIndex()
+    grid.add('a', 10.0, 10.0)
+    grid.add('a', 20.0, 20.0)
+    assert len(grid) == 1
+    assert grid.nearest(10.0, 10.0, radius_km=5) is None
+    grid.discard('a')
+    grid.discard('a')
+    assert len(grid) == 0
+
+@pytest.mark.asyncio
+async def test_nearby_weather_served_from_cache():
+    london = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    westminster = {'name': 'Westminster', 'latitude': 51.4975, 'longitude': -0.1357}
+    with patch('requests.get', return_value=fixture_response('current_london.json')) as mock_get:
+        await get_weather_data('London', london)
+        weather = await get_weather_data('Westminster', westminster)
+    assert mock_get.call_count == 1
+    assert weather['name'] == 'Westminster'
+
+@pytest.mark.asyncio
+async def test_distant_forecast_is_fetched():
+    london = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    paris = {'name': 'Paris', 'latitude': 48.85341, 'longitude': 2.3488}
+    with patch('requests.get', return_value=fixture_response('forecast_london.json')) as mock_get:
+        await get_forecast_data('London', london)
+        await get_forecast_data('London', london)
+        await get_forecast_data('Paris', paris)
+    assert mock_get.call_count == 2
+
+@pytest.mark.asyncio
+async def test_zero_radius_only_reuses_same_spot():
+    london = {'name': 'London', 'latitude': 51.50853, 'longitude': -0.12574}
+    westminster = {'name': 'Westminster', 'latitude': 51.4975, 'longitude': -0.1357}
+    with patch('app.api.WEATHER_NEARBY_RADIUS_KM', 0), \
+            patch('requests.get', return_value=fixture_response('current_london.json')) as mock_get:
+        await get_weather_data('London', london)
+        await get_weather_data('London', london)
+        await get_weather_data('Westminster', westminster)
+    assert mock_get.call_count == 2
@@ -0,0 +1,119 @@
+import math
+import multiprocessing
+import os
+from array import array
+from datetime import date
+
+import pytest
+
+from app.timeseries import TimeSeriesStore
+
+FIELDS = ('temperature_2m_max', 'precipitation_sum')
+KEY = '51.51,-0.13'
+
+
+def daily(days, offset=0.0):
+    return {
+        'time': [day.isoformat() for day in days],
+        'temperature_2m_max': array('d', (10.0 + day.day + offset for day in days)),
+        'precipitation_sum': array('d', (float(day.day) for day in days)),
+    }
+
+
+def span(first, last):
+    return [date(2024, 1, d) for d in range(first, last + 1)]
+
+
+def test_missing_ranges_and_read(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    assert store.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 10)) == [(date(2024, 1, 1), date(2024, 1, 10))]
+    store.append(KEY, daily(span(4, 6)))
+    assert store.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 10)) == [
+        (date(2024, 1, 1), date(2024, 1, 3)), (date(2024, 1, 7), date(2024, 1, 10))]
+    stored = store.read(KEY, date(2024, 1, 5), date(2024, 1, 8))
+    assert stored['time'] == ['2024-01-05', '2024-01-06']
+    assert list(stored['temperature_2m_max']) == [15.0, 16.0]
+
+def test_append_is_append_only_and_sorted_on_read(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    store.append(KEY, daily(span(8, 9)))
+    assert store.append(KEY, daily(span(1, 9), offset=100)) == 7  # Stored days are never rewritten
+    stored = store.read(KEY, date(2024, 1, 1), date(2024, 1, 9))
+    assert stored['time'] == [day.isoformat() for day in span(1, 9)]
+    assert list(stored['temperature_2m_max'])[-2:] == [18.0, 19.0]
+
+def test_persists_across_instances(tmp_path):
+    TimeSeriesStore(str(tmp_path), FIELDS).append(KEY, daily(span(1, 3)))
+    reopened = TimeSeriesStore(str(tmp_path), FIELDS)
+    assert reopened.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 3)) == []
+    assert list(reopened.read(KEY, date(2024, 1, 1), date(2024, 1, 3))['precipitation_sum']) == [1.0, 2.0, 3.0]
+
+def test_interrupted_append_is_cut_back(tmp_path):
+    TimeSeriesStore(str(tmp_path), FIELDS).append(KEY, daily(span(1, 2)))
+    # A crash after writing a field column but before the day column
+    column = tmp_path / '51.51_-0.13' / 'temperature_2m_max.f64'
+    with open(column, 'ab') as f:
+        array('d', [99.0]).tofile(f)
+    reopened = TimeSeriesStore(str(tmp_path), FIELDS)
+    assert reopened.read(KEY, date(2024, 1, 1), date(2024, 1, 3))['time'] == ['2024-01-01', '2024-01-02']
+    assert os.path.getsize(column) == 2 * 8
+
+def test_new_field_reads_as_missing(tmp_path):
+    TimeSeriesStore(str(tmp_path), FIELDS[:1]).append(KEY, daily(span(1, 2)))
+    widened = TimeSeriesStore(str(tmp_path), FIELDS)
+    stored = widened.read(KEY, date(2024, 1, 1), date(2024, 1, 2))
+    assert all(math.isnan(value) for value in stored['precipitation_sum'])
+
+def test_days_missing_required_fields_stay_missing(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS, required=('temperature_2m_max',))
+    partial = daily(span(1, 3))
+    partial['temperature_2m_max'][2] = math.nan  # Not filled in by the archive yet
+    assert store.append(KEY, partial) == 2
+    assert store.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 3)) == [(date(2024, 1, 3), date(2024, 1, 3))]
+    assert store.append(KEY, daily(span(3, 3))) == 1
+    assert store.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 3)) == []
+
+def test_incomplete_stored_day_is_replaced(tmp_path):
+    partial = daily(span(1, 2))
+    partial['temperature_2m_max'][1] = math.nan
+    TimeSeriesStore(str(tmp_path), FIELDS).append(KEY, partial)  # Stored before days were checked
+    store = TimeSeriesStore(str(tmp_path), FIELDS, required=('temperature_2m_max',))
+    assert store.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 2)) == [(date(2024, 1, 2), date(2024, 1, 2))]
+    assert store.append(KEY, daily(span(1, 2))) == 1
+    stored = store.read(KEY, date(2024, 1, 1), date(2024, 1, 2))
+    assert stored['time'] == ['2024-01-01', '2024-01-02']
+    assert list(stored['temperature_2m_max']) == [11.0, 12.0]
+    reopened = TimeSeriesStore(str(tmp_path), FIELDS, required=('temperature_2m_max',))
+    assert reopened.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 2)) == []
+
+def test_sees_days_appended_by_another_process(tmp_path):
+    # Two stores on one directory stand in for two worker processes
+    worker_a, worker_b = TimeSeriesStore(str(tmp_path), FIELDS), TimeSeriesStore(str(tmp_path), FIELDS)
+    assert worker_b.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 4)) == [(date(2024, 1, 1), date(2024, 1, 4))]
+    worker_a.append(KEY, daily(span(1, 3)))
+    assert worker_b.missing_ranges(KEY, date(2024, 1, 1), date(2024, 1, 4)) == [(date(2024, 1, 4), date(2024, 1, 4))]
+    assert worker_b.append(KEY, daily(span(2, 4))) == 1  # Days worker A stored are not written again
+    assert worker_a.read(KEY, date(2024, 1, 1), date(2024, 1, 4))['time'][-1] == '2024-01-04'
+
+
+def append_spans(root, first_ordinals):
+    store = TimeSeriesStore(root, FIELDS)
+    for first in first_ordinals:
+        store.append(KEY, daily([date.fromordinal(first + n) for n in range(10)]))
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_concurrent_processes_keep_columns_aligned(tmp_path):
+    first, last = date(2023, 1, 1), date(2023, 12, 31)
+    starts = range(first.toordinal(), last.toordinal() - 8)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=append_spans, args=(str(tmp_path), starts[offset::4])) for offset in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    stored = TimeSeriesStore(str(tmp_path), FIELDS).read(KEY, first, last)
+    assert len(stored['time']) == 365
+    # Every row still carries its own day's values and no day was written twice
+    assert list(stored['precipitation_sum']) == [float(date.fromisoformat(day).day) for day in stored['time']]
+    assert os.path.getsize(tmp_path / '51.51_-0.13' / 'day.i32') == 365 * 4
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.watchdog import LoopWatchdog, blocking_chain
+
+
+def fake_frame(name, filename, module, back=None):
+    return SimpleNamespace(f_code=SimpleNamespace(co_name=name, co_filename=filename),
+                           f_globals={'__name__': module}, f_back=back)
+
+def fetch_blocking():
+    time.sleep(0.3)
+
+def handle_blocking():
+    fetch_blocking()
+
+
+def test_blocking_chain_keeps_app_frames_and_first_library_call():
+    from app.frames import PROJECT_ROOT
+    frame = fake_frame('_run_once', '/usr/lib/python3/asyncio/base_events.py', 'asyncio.base_events')
+    frame = fake_frame('serve', f'{PROJECT_ROOT}/main.py', 'main', frame)
+    frame = fake_frame('handle_search', f'{PROJECT_ROOT}/main.py', 'main', frame)
+    frame = fake_frame('get_coordinates', f'{PROJECT_ROOT}/app/api.py', 'app.api', frame)
+    frame = fake_frame('get', '/venv/lib/site-packages/requests/api.py', 'requests.api', frame)
+    frame = fake_frame('request', '/venv/lib/site-packages/requests/api.py', 'requests.api', frame)
+    frame = fake_frame('recv_into', '/usr/lib/python3/socket.py', 'socket', frame)
+    assert blocking_chain(frame) == ['serve', 'handle_search', 'get_coordinates', 'requests.get']
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocked_loop():
+    watchdog = LoopWatchdog(threshold_ms=50)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.06)
+        handle_blocking()
+        await asyncio.sleep(0.1)
+    finally:
+        watchdog.stop()
+    assert watchdog.stalls == 1
+    report = watchdog.reports[0]
+    assert report['chain'][-2:] == ['handle_blocking', 'fetch_blocking']
+    assert 200 <= report['blocked_ms'] <= 400
+    assert watchdog.stats()['max_lag_ms'] >= 200
+
+@pytest.mark.asyncio
+async def test_watchdog_quiet_when_loop_is_free():
+    watchdog = LoopWatchdog(threshold_ms=50)
+    watchdog.start()
+    try:
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+    finally:
+        watchdog.stop()
+    assert watchdog.stalls == 0